@@ -1,13 +1,32 @@
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from prompt.template import TASK_DEPENDENCY_ANALYSIS_WITH_CODE_PROMPT, TASK_DEPENDENCY_ANALYSIS_PROMPT, DAG_CONSTRUCTION_PROMPT, CODE_STRUCTURE_PROMPT
 import json
 import sys
 
 class Coordinator:
-    def __init__(self, llm):
+    def __init__(self, llm, background_workers: int = 4):
         self.llm = llm
         self.memory = {}
         self.code_memory = {}
+        self.executor = ThreadPoolExecutor(max_workers=background_workers)
+        self.background_jobs = []
+
+    def submit_background(self, fn, *args, **kwargs):
+        """Run work that no downstream task depends on (e.g. chart generation) off the critical path."""
+        future = self.executor.submit(fn, *args, **kwargs)
+        self.background_jobs.append(future)
+        return future
+
+    def wait_background(self):
+        pending = [job for job in self.background_jobs if not job.done()]
+        if pending:
+            print(f"[Background] Waiting for {len(pending)} background job(s)...")
+        wait(self.background_jobs)
+        for job in self.background_jobs:
+            if job.exception() is not None:
+                print(f"[Background] ✗ Job failed: {str(job.exception())[:50]}...")
+        self.background_jobs = []
 
     def compute_dag_order(self, graph):
         """
@@ -1,9 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
 from .base_agent import BaseAgent
-from prompt.template import CREATE_CHART_PROMPT
+from prompt.template import CREATE_CHART_PROMPT, CHART_FOCUS_PROMPT
+
+
+CHART_FOCUSES = [
+    'the trend or evolution of the key quantities over time or iterations',
+    'a comparison across groups, scenarios or candidate models',
+    'the distribution of a key variable or of the model residuals',
+    'the correlation or relationship between the main variables',
+    'the sensitivity of the results to the key model parameters',
+    'the validation of model outputs against observed data',
+]
+
 
 class ChartCreator(BaseAgent):
-    def __init__(self, llm):
+    def __init__(self, llm, embedding_scorer=None, similarity_threshold: float = 0.92):
         super().__init__(llm)
+        self.embedding_scorer = embedding_scorer
+        self.similarity_threshold = similarity_threshold
     
     def create_single_chart(self, paper_content: str, existing_charts: str, user_prompt: str=''):
         prompt = CREATE_CHART_PROMPT.format(paper_content=paper_content, existing_charts=existing_charts, user_prompt=user_prompt)
@@ -19,3 +33,34 @@ class ChartCreator(BaseAgent):
             existing_charts = '\n---\n'.join(charts)
         print(f"      [Chart Generation] ✓ Completed ({chart_num} charts)")
         return charts
+
+    def remove_duplicates(self, charts):
+        if self.embedding_scorer is None or len(charts) < 2:
+            return charts
+        embeddings = self.embedding_scorer.embed(charts)
+        similarities = (embeddings @ embeddings.T).tolist()
+        kept = []
+        for i in range(len(charts)):
+            if all(similarities[i][j] < self.similarity_threshold for j in kept):
+                kept.append(i)
+        return [charts[i] for i in kept]
+
+    def create_charts_parallel(self, paper_content: str, chart_num: int, user_prompt: str=''):
+        """
+        Generate all charts at once, each with a different pre-assigned focus instead of the growing list of
+        existing charts. Near-duplicates are dropped by embedding similarity and replaced sequentially.
+        """
+        focuses = [CHART_FOCUSES[i % len(CHART_FOCUSES)] for i in range(chart_num)]
+        prompts = [
+            f"{user_prompt}\n" + CHART_FOCUS_PROMPT.format(chart_focus=focus, other_focuses='; '.join(f for f in focuses if f != focus) or 'none')
+            for focus in focuses
+        ]
+        print(f"      [Chart Generation] Generating {chart_num} charts concurrently...")
+        with ThreadPoolExecutor(max_workers=max(1, chart_num)) as executor:
+            charts = list(executor.map(lambda prompt: self.create_single_chart(paper_content, '', prompt), prompts))
+        charts = self.remove_duplicates(charts)
+        while len(charts) < chart_num:
+            print(f"      [Chart Generation] Replacing duplicate chart ({len(charts)+1}/{chart_num})...")
+            charts.append(self.create_single_chart(paper_content, '\n---\n'.join(charts), user_prompt))
+        print(f"      [Chart Generation] ✓ Completed ({chart_num} charts)")
+        return charts
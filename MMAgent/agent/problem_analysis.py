@@ -1,10 +1,12 @@
 from .base_agent import BaseAgent
+from utils.convergence import refine
 from prompt.template import PROBLEM_ANALYSIS_PROMPT, PROBLEM_ANALYSIS_CRITIQUE_PROMPT, PROBLEM_ANALYSIS_IMPROVEMENT_PROMPT, PROBLEM_MODELING_PROMPT, PROBLEM_MODELING_CRITIQUE_PROMPT, PROBLEM_MODELING_IMPROVEMENT_PROMPT
 
 
 class ProblemUnderstanding(BaseAgent):
-    def __init__(self, llm):
+    def __init__(self, llm, convergence=None):
         super().__init__(llm)
+        self.convergence = convergence
     
     def analysis_actor(self, modeling_problem: str, user_prompt: str=''):
         prompt = PROBLEM_ANALYSIS_PROMPT.format(modeling_problem=modeling_problem, user_prompt=user_prompt).strip()
@@ -21,14 +23,10 @@ class ProblemUnderstanding(BaseAgent):
     def analysis(self, modeling_problem: str, round: int = 3, user_prompt: str = ''):
         print(f"  [Problem Analysis] Actor: Generating initial analysis...")
         problem_analysis = self.analysis_actor(modeling_problem, user_prompt)
-        for i in range(round):
-            print(f"  [Problem Analysis] Round {i+1}/{round}: Critic...")
-            problem_analysis_critique = self.analysis_critic(modeling_problem, problem_analysis)
-            print(f"  [Problem Analysis] Round {i+1}/{round}: Improvement...")
-            problem_analysis_improvement = self.analysis_improvement(modeling_problem, problem_analysis, problem_analysis_critique, user_prompt)
-            problem_analysis = problem_analysis_improvement
-        print(f"  [Problem Analysis] Completed ({round} rounds)")
-        return problem_analysis
+        return refine('Problem Analysis', problem_analysis, round,
+                      critic=lambda analysis: self.analysis_critic(modeling_problem, analysis),
+                      improve=lambda analysis, critique: self.analysis_improvement(modeling_problem, analysis, critique, user_prompt),
+                      convergence=self.convergence)
 
     def modeling_actor(self, modeling_problem: str, problem_analysis: str, user_prompt: str=''):
         prompt = PROBLEM_MODELING_PROMPT.format(modeling_problem=modeling_problem, problem_analysis=problem_analysis, user_prompt=user_prompt).strip()
@@ -45,11 +43,7 @@ class ProblemUnderstanding(BaseAgent):
     def modeling(self, modeling_problem: str, problem_analysis: str, round: int = 3, user_prompt: str = ''):
         print(f"  [Problem Modeling] Actor: Generating initial modeling solution...")
         modeling_solution = self.modeling_actor(modeling_problem, problem_analysis, user_prompt)
-        for i in range(round):
-            print(f"  [Problem Modeling] Round {i+1}/{round}: Critic...")
-            modeling_solution_critique = self.modeling_critic(modeling_problem, problem_analysis, modeling_solution)
-            print(f"  [Problem Modeling] Round {i+1}/{round}: Improvement...")
-            modeling_solution_improvement = self.modeling_improvement(modeling_problem, problem_analysis, modeling_solution, modeling_solution_critique, user_prompt)
-            modeling_solution = modeling_solution_improvement
-        print(f"  [Problem Modeling] Completed ({round} rounds)")
-        return modeling_solution
\ No newline at end of file
+        return refine('Problem Modeling', modeling_solution, round,
+                      critic=lambda solution: self.modeling_critic(modeling_problem, problem_analysis, solution),
+                      improve=lambda solution, critique: self.modeling_improvement(modeling_problem, problem_analysis, solution, critique, user_prompt),
+                      convergence=self.convergence)
\ No newline at end of file
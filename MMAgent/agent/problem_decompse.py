@@ -1,4 +1,5 @@
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from .base_agent import BaseAgent
 from prompt.template import TASK_DECOMPOSE_PROMPT, TASK_DESCRIPTION_PROMPT
 from utils.utils import read_json_file
@@ -26,9 +27,8 @@ class ProblemDecompose(BaseAgent):
     def decompose_and_refine(self, modeling_problem: str, problem_analysis: str, modeling_solution: str, decomposed_principle: str, tasknum: int, user_prompt: str=''):
         print(f"    [Decomposition] Decomposing problem into {tasknum} tasks...")
         decomposed_subtasks = self.decompose(modeling_problem, problem_analysis, modeling_solution, decomposed_principle, tasknum, user_prompt)
-        print(f"    [Decomposition] Refining task descriptions...")
-        for task_i in range(len(decomposed_subtasks)):
-            print(f"      [Refinement] Refining task {task_i+1}/{len(decomposed_subtasks)}...")
-            refined_subtask = self.refine(modeling_problem, problem_analysis, modeling_solution, decomposed_subtasks, task_i)
-            decomposed_subtasks[task_i] = refined_subtask
-        return decomposed_subtasks
+        print(f"    [Decomposition] Refining {len(decomposed_subtasks)} task descriptions concurrently...")
+        # Every refinement only reads the decomposed list, so all of them are issued at once; map keeps the order.
+        with ThreadPoolExecutor(max_workers=max(1, len(decomposed_subtasks))) as executor:
+            refined_subtasks = list(executor.map(lambda task_i: self.refine(modeling_problem, problem_analysis, modeling_solution, decomposed_subtasks, task_i), range(len(decomposed_subtasks))))
+        return refined_subtasks
@@ -1,62 +1,157 @@
+import copy
+import hashlib
 import json
+import os
+import pickle
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from functools import partial
 from .base_agent import BaseAgent
 from prompt.template import METHOD_CRITIQUE_PROMPT
 from utils.convert_format import markdown_to_json_method
 from utils.utils import parse_llm_output_to_json
-from utils.embedding import EmbeddingScorer
+from utils.embedding import get_embedding_scorer
+from utils.lexical import BM25Index, reciprocal_rank_fusion
+
+
+# Bump when markdown_to_json_method changes the shape of the tree, so stale caches are ignored.
+METHOD_TREE_CACHE_VERSION = 1
+
+
+# (HMML.md path, content hash, cache dir) -> pickled tree, so an edited HMML.md is re-read even in a long-running process
+_method_tree_bytes = {}
+
+
+def _load_method_tree_bytes(md_path: str, cache_dir: str) -> bytes:
+    with open(md_path, "rb") as f:
+        markdown_bytes = f.read()
+    digest = hashlib.sha256(markdown_bytes).hexdigest()
+    key = (md_path, digest, cache_dir)
+    if key in _method_tree_bytes:
+        return _method_tree_bytes[key]
+    cache_path = os.path.join(cache_dir, f"HMML.v{METHOD_TREE_CACHE_VERSION}.{digest[:16]}.pkl")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            tree_bytes = f.read()
+    else:
+        tree_bytes = pickle.dumps(markdown_to_json_method(markdown_bytes.decode("utf-8")), protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, "wb") as f:
+            f.write(tree_bytes)
+        os.replace(tmp_path, cache_path)
+    _method_tree_bytes[key] = tree_bytes
+    return tree_bytes
+
+
+def method_text(method: dict) -> str:
+    return f"{method['method']}: {method.get('description', '')}"
+
+
+def iter_method_nodes(nodes):
+    """Yield every method class and method of the tree as a {"method", "description"} entry."""
+    for node in nodes:
+        name = node.get('method_class', node.get('method'))
+        if name != 'root':
+            yield {"method": name, "description": node.get("description", ""), "kind": "class" if 'children' in node else "method"}
+        yield from iter_method_nodes(node.get('children', []))
 
-import json
+
+def method_ancestors(nodes) -> dict:
+    """
+    Map each leaf method's text to the method classes MethodScorer averages into its final score:
+    the classes on its path strictly between the top-level domain and the leaf's own class, outermost first.
+    """
+    ancestors = {}
+
+    def walk(node, parents):
+        for child in node.get('children', []):
+            if 'children' in child:
+                walk(child, parents + [{"method": node['method_class'], "description": node.get("description", "")}])
+            else:
+                ancestors.setdefault(method_text(child), parents)
+    for domain in nodes:
+        for child in domain.get('children', []):
+            if 'children' in child:
+                walk(child, [])
+            else:
+                ancestors.setdefault(method_text(child), [])
+    return ancestors
+
+
+def load_method_tree(md_path: str = 'MMAgent/HMML/HMML.md', cache_dir: str = 'MMAgent/cache/hmml'):
+    """
+    Load the parsed HMML method tree. The parse result is cached as a pickle named by the
+    HMML.md content hash and the cache version, so it is rebuilt only when the markdown changes.
+    Cache files are never modified after creation and can be shared read-only between processes.
+    Every call returns a fresh copy because retrieval writes scores into the tree.
+    """
+    return pickle.loads(_load_method_tree_bytes(md_path, cache_dir))
 
 
 class MethodScorer:
 
-    def __init__(self, score_func, parent_weight=0.5, child_weight=0.5):
+    def __init__(self, score_func, parent_weight=0.5, child_weight=0.5, max_workers=1, prune_threshold=None, beam_width=None):
         self.parent_weight = parent_weight
         self.child_weight = child_weight
         self.score_func = score_func
+        self.max_workers = max_workers
+        self.prune_threshold = prune_threshold
+        self.beam_width = beam_width
+        self.groups_scored = 0
         self.leaves = []
 
     def process(self, data):
+        """
+        Score the tree level by level: all sibling groups at the same depth are scored together.
+        With a beam width, only the best beam_width method classes of each depth (ranked by the
+        average score along their path) are expanded, so leaf methods are scored only under them.
+        """
         self.leaves = []
-        for root_node in data:
-            self._process_node(root_node, parent_scores=[])
+        self.groups_scored = 0
+        # Each entry is a node and the scored ancestors whose average weighs its leaves
+        level = [(root_node, []) for root_node in data]
+        while level:
+            groups = [(node, parents) for node, parents in level if node.get('children')]
+            results = self._score_groups([node['children'] for node, _ in groups])
+            level = []
+            for (node, parents), llm_result in zip(groups, results):
+                children = node['children']
+                for idx, child in enumerate(children):
+                    child['score'] = llm_result[idx]['score'] if idx < len(llm_result) else 0
+                if 'method_class' in children[0]:
+                    new_parents = parents + [node] if node.get('score') is not None else parents
+                    level.extend((child, new_parents) for child in self._expand(children))
+                else:
+                    for child in children:
+                        child['final_score'] = self.final_score([parent['score'] for parent in parents], child['score'])
+                        child['ancestors'] = parents
+            if self.beam_width is not None:
+                level.sort(key=lambda item: sum(parent['score'] for parent in item[1] + [item[0]]) / (len(item[1]) + 1), reverse=True)
+                level = level[:self.beam_width]
         for root_node in data:
             self._collect_leaves(root_node)
         return self.leaves
 
-    def _process_node(self, node, parent_scores):
-        if 'children' in node:
-            children = node.get('children', [])
-            if children:
-                first_child = children[0]
-                if 'method_class' in first_child:
-                    input_for_llm = [{"method": child["method_class"], "description": child.get("description", "")} for child in children]
-                    llm_result = self.score_func(input_for_llm)
-                    for idx, child in enumerate(children):
-                        if idx < len(llm_result):
-                            child['score'] = llm_result[idx]['score']
-                        else:
-                            child['score'] = 0
-                    current_score = node.get('score')
-                    new_parent = parent_scores.copy()
-                    if current_score is not None:
-                        new_parent.append(current_score)
-                    for child in children:
-                        self._process_node(child, new_parent)
-                else:
-                    input_for_llm = [{"method": child["method"], "description": child.get("description", "")} for child in children]
-                    llm_result = self.score_func(input_for_llm)
-                    for idx, child in enumerate(children):
-                        if idx < len(llm_result):
-                            child_score = llm_result[idx]['score']
-                        else:
-                            child_score = 0
-                        child['score'] = child_score
-                        parent_avg = sum(parent_scores) / len(parent_scores) if parent_scores else 0
-                        final_score = parent_avg * self.parent_weight + child_score * self.child_weight
-                        child['final_score'] = final_score
+    def final_score(self, parent_scores, child_score):
+        parent_avg = sum(parent_scores) / len(parent_scores) if parent_scores else 0
+        return parent_avg * self.parent_weight + child_score * self.child_weight
+
+    def _score_groups(self, groups):
+        self.groups_scored += len(groups)
+        inputs = [[{"method": child.get("method_class", child.get("method")), "description": child.get("description", "")} for child in children] for children in groups]
+        if self.max_workers > 1 and len(inputs) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(inputs))) as executor:
+                return list(executor.map(self.score_func, inputs))
+        return [self.score_func(group) for group in inputs]
+
+    def _expand(self, children):
+        """Children to descend into; in pruned mode those below the threshold are skipped, except the best one."""
+        if self.prune_threshold is None:
+            return children
+        best = max(children, key=lambda child: child['score'])
+        return [child for child in children if child is best or child['score'] >= self.prune_threshold]
 
     def _collect_leaves(self, node):
         if 'children' in node:
@@ -67,47 +162,211 @@ class MethodScorer:
                 self.leaves.append({
                     "method": node["method"],
                     "description": node.get("description", ""),
-                    "score": node['final_score']
+                    "score": node['final_score'],
+                    "ancestors": [{"method": parent["method_class"], "description": parent.get("description", "")} for parent in node['ancestors']]
                 })
 
 
 class MethodRetriever(BaseAgent):
-    def __init__(self, llm, rag=True):
+    def __init__(self, llm, rag=True, max_workers=8, prune_threshold=None, beam_width=None, fusion='weighted', hybrid_alpha=0.5,
+                 embedding_backend='fp32', embedding_threads=None, embedding_dimension=768, vector_store='exact', vector_candidates=None,
+                 score_cache_dir='MMAgent/cache/method_scores', vector_cache_dir='MMAgent/cache/method_vectors'):
         super().__init__(llm)
         self.rag = rag
-        self.embedding_scorer = EmbeddingScorer()
-        json_path = 'MMAgent/HMML/HMML.json'
+        self.max_workers = max_workers
+        self.prune_threshold = prune_threshold
+        self.beam_width = beam_width
+        self.fusion = fusion
+        self.hybrid_alpha = hybrid_alpha
+        self.score_cache_dir = score_cache_dir
+        self.vector_store = vector_store
+        self.vector_cache_dir = vector_cache_dir
+        self.vector_candidates = vector_candidates
+        self._method_store = None
+        os.makedirs(score_cache_dir, exist_ok=True)
+        self.embedding_scorer = get_embedding_scorer(backend=embedding_backend, num_threads=embedding_threads, dimension=embedding_dimension)
         md_path = 'MMAgent/HMML/HMML.md'
 
         with open(str(md_path), "r", encoding="utf-8") as f:
             self.markdown_text = f.read()
-        self.method_tree = markdown_to_json_method(self.markdown_text)
-        with open(json_path, "w+", encoding="utf-8") as f:
-            json.dump(self.method_tree, f, ensure_ascii=False, indent=4)
-        
+        self.method_tree = load_method_tree(md_path)
+        self.method_ancestors = method_ancestors(self.method_tree)
+        self.lexical_index = BM25Index({method_text(method): method_text(method) for method in iter_method_nodes(self.method_tree)})
+
+    def method_store(self):
+        """
+        The persisted vector store of every HMML method class and method for the current embedding model.
+        It is synced with the tree on first use: entries no longer in HMML.md are removed and only new
+        or edited ones are embedded.
+        """
+        if self._method_store is not None:
+            return self._method_store
+        from utils.vector_store import create_vector_store, load_vector_store
+
+        model_id = self.embedding_scorer.query_cache.model_id
+        path = os.path.join(self.vector_cache_dir, f"{hashlib.sha256(model_id.encode()).hexdigest()[:16]}.{self.vector_store}.npz")
+        store = load_vector_store(path) if os.path.exists(path) else create_vector_store(self.vector_store, self.embedding_scorer.dimension)
+        entries = {}
+        for domain in self.method_tree:
+            for method in iter_method_nodes([domain]):
+                entries.setdefault(method_text(method), dict(method, domain=domain.get('method_class')))
+        stale = [text for text in store.live_ids() if text not in entries]
+        missing = [text for text in entries if text not in store]
+        store.remove(stale)
+        for start in range(0, len(missing), 16):
+            batch = missing[start:start + 16]
+            store.add(batch, self.embedding_scorer.embed(batch).cpu().numpy(), [entries[text] for text in batch])
+        if stale or missing:
+            store.save(path)
+        self._method_store = store
+        return store
+
+    def dense_score_method(self, problem_description: str, methods: List[dict]):
+        """Same contract as EmbeddingScorer.score_method, but method vectors come from the vector store."""
+        if not self.vector_store:
+            return self.embedding_scorer.score_method(problem_description, methods)
+        query = self.embedding_scorer.embed_query(problem_description).cpu().numpy()
+        scores = self.method_store().get([method_text(method) for method in methods]) @ query * 100
+        return [{"method_index": i, "score": float(score)} for i, score in enumerate(scores, start=1)]
+
+    def search_methods(self, problem_description: str, top_k: int = 6, domain: str = None) -> List[dict]:
+        """
+        Nearest-neighbour search over leaf methods in the vector store, optionally within one HMML domain.
+        Results carry their ancestors, so they can be re-ranked hierarchically with rerank().
+        """
+        query = self.embedding_scorer.embed_query(problem_description).cpu().numpy()
+        filters = {'kind': 'method'} if domain is None else {'kind': 'method', 'domain': domain}
+        store = self.method_store()
+        return [{"method": store.metadata[text]['method'], "description": store.metadata[text]['description'], "score": score * 100,
+                 "ancestors": self.method_ancestors.get(text, [])}
+                for text, score in store.search(query, top_k, **filters)]
+
+    def searches_vector_store(self, method: str) -> bool:
+        """Embedding retrieval takes its candidates from the vector store instead of walking the whole tree."""
+        return method == 'embedding' and bool(self.vector_store) and bool(self.vector_candidates)
+
     def llm_score_method(self, problem_description: str, methods: List[dict]):
         methods_str = '\n'.join([f"{i+1}. {method['method']} {method.get('description', '')}" for i, method in enumerate(methods)])
+        # Scores are cached per (model, problem description, sibling group)
+        key = hashlib.sha256(f"{getattr(self.llm, 'model_name', '')}\n{problem_description}\n{methods_str}".encode()).hexdigest()
+        cache_path = os.path.join(self.score_cache_dir, f"{key}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
         prompt = METHOD_CRITIQUE_PROMPT.format(problem_description=problem_description, methods=methods_str)
         answer = self.llm.generate(prompt)
         method_scores = parse_llm_output_to_json(answer).get('methods', [])
         method_scores = sorted(method_scores, key=lambda x: x['method_index'])
         for method in method_scores:
             method['score'] = sum(method['scores'].values()) / len(method['scores'])
+        if method_scores:
+            fd, tmp_path = tempfile.mkstemp(dir=self.score_cache_dir, suffix='.tmp')
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(method_scores, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
         return method_scores
 
+    def score_func(self, problem_description: str, method: str = 'embedding'):
+        """The group scoring function for a retrieval mode and the number of groups it may score concurrently."""
+        if method == 'embedding':
+            return partial(self.dense_score_method, problem_description), 1
+        if method == 'hybrid':
+            return self.hybrid_score_func(problem_description), 1
+        return partial(self.llm_score_method, problem_description), self.max_workers
+
+    def score_methods(self, problem_description: str, method: str = 'embedding', beam_width=None) -> List[dict]:
+        """Score the leaf methods of the HMML tree for the problem, best first."""
+        score_func, max_workers = self.score_func(problem_description, method)
+        # The threshold is on the LLM critic's 1-5 scale; embedding (cosine x 100) and hybrid (0-1) scores are never pruned
+        prune_threshold = self.prune_threshold if method == 'llm' else None
+        scorer = MethodScorer(score_func, max_workers=max_workers, prune_threshold=prune_threshold, beam_width=beam_width)
+        method_scores = scorer.process(copy.deepcopy(self.method_tree))
+        method_scores.sort(key=lambda x: x['score'], reverse=True)
+        return method_scores
+
+    def rerank(self, problem_description: str, candidates: List[dict], method: str = 'embedding') -> List[dict]:
+        """
+        Re-score prefetched candidates for a new query without another pass over the tree: the candidate
+        methods and their scored ancestors are scored in one call and combined exactly as MethodScorer does.
+        Only meaningful for the embedding and hybrid modes, whose scores do not depend on the group.
+        """
+        entries = {}
+        for candidate in candidates:
+            for entry in candidate['ancestors'] + [candidate]:
+                entries.setdefault(method_text(entry), {"method": entry['method'], "description": entry['description']})
+        score_func, _ = self.score_func(problem_description, method)
+        results = score_func(list(entries.values()))
+        scores = {text: results[i]['score'] if i < len(results) else 0 for i, text in enumerate(entries)}
+        scorer = MethodScorer(score_func)
+        reranked = [dict(candidate, score=scorer.final_score([scores[method_text(parent)] for parent in candidate['ancestors']], scores[method_text(candidate)]))
+                    for candidate in candidates]
+        reranked.sort(key=lambda x: x['score'], reverse=True)
+        return reranked
+
+    def beam_recall(self, problem_description: str, beam_width: int, top_k: int = 6, method: str = 'embedding') -> float:
+        """Fraction of the exhaustive top_k methods that beam retrieval with beam_width also returns in its top_k."""
+        exhaustive = [m['method'] for m in self.score_methods(problem_description, method)[:top_k]]
+        beam = {m['method'] for m in self.score_methods(problem_description, method, beam_width)[:top_k]}
+        return sum(name in beam for name in exhaustive) / len(exhaustive) if exhaustive else 1.0
+
+    def candidate_recall(self, problem_description: str, candidate_num: int, top_k: int = 6) -> float:
+        """Fraction of the exhaustive top_k methods that re-ranking the candidate_num nearest vector-store methods also returns."""
+        exhaustive = [m['method'] for m in self.score_methods(problem_description, 'embedding')[:top_k]]
+        candidates = self.rerank(problem_description, self.search_methods(problem_description, candidate_num), 'embedding')
+        found = {m['method'] for m in candidates[:top_k]}
+        return sum(name in found for name in exhaustive) / len(exhaustive) if exhaustive else 1.0
+
+    def hybrid_score_func(self, problem_description: str, batch_size: int = 16):
+        """
+        Build a group scoring function that fuses dense similarity with BM25. Reciprocal rank fusion
+        ranks the whole method library once per query, so scores of different groups stay comparable;
+        weighted fusion scores each group on demand with BM25 normalized by the best library match.
+        """
+        lexical_scores = self.lexical_index.scores(problem_description)
+        if self.fusion == 'rrf':
+            library = list(iter_method_nodes(self.method_tree))
+            dense = []
+            for start in range(0, len(library), batch_size):
+                dense += [result['score'] for result in self.dense_score_method(problem_description, library[start:start + batch_size])]
+            fused = reciprocal_rank_fusion([dense, [lexical_scores.get(method_text(method), 0.0) for method in library]])
+            fused_scores = {method_text(method): score for method, score in zip(library, fused)}
+            return lambda methods: [{"method_index": i, "score": fused_scores[method_text(method)]} for i, method in enumerate(methods, start=1)]
+
+        top = max(lexical_scores.values(), default=0.0) or 1.0
+
+        def weighted(methods: List[dict]):
+            # score_method reports cosine similarity x 100; bring both terms to [0, 1] before mixing
+            dense = self.dense_score_method(problem_description, methods)
+            return [{"method_index": i, "score": self.hybrid_alpha * result['score'] / 100 + (1 - self.hybrid_alpha) * lexical_scores.get(method_text(method), 0.0) / top}
+                    for i, (method, result) in enumerate(zip(methods, dense), start=1)]
+        return weighted
+
     def format_methods(self, methods: List[str]):
         return '\n'.join([f"**{method['method']}:** {method['description']}" for method in methods])
 
-    def retrieve_meethods(self, problem_description: str, top_k: int=6, method: str='embedding'):
+    def prefetch_candidates(self, preliminary_description: str, candidate_num: int = 30, method: str = 'embedding') -> List[dict]:
+        """Speculative retrieval from a preliminary query (e.g. the task description alone), to be re-ranked later."""
+        if self.searches_vector_store(method):
+            return self.search_methods(preliminary_description, max(candidate_num, self.vector_candidates))
+        return self.score_methods(preliminary_description, method, self.beam_width)[:candidate_num]
+
+    def retrieve_meethods(self, problem_description: str, top_k: int=6, method: str='embedding', candidates: List[dict] = None):
         if self.rag:
             print(f"      [Method Retrieval] Using {method} method, retrieving top {top_k} methods...")
-            if method == 'embedding':
-                score_func = partial(self.embedding_scorer.score_method, problem_description)
+            if candidates is None and self.searches_vector_store(method):
+                candidates = self.search_methods(problem_description, self.vector_candidates)
+                print(f"      [Method Retrieval] Re-ranking {len(candidates)} nearest methods from the {self.vector_store} vector store")
+                method_scores = self.rerank(problem_description, candidates, method)
+            elif candidates is not None:
+                print(f"      [Method Retrieval] Re-ranking {len(candidates)} prefetched candidates with the full query")
+                method_scores = self.rerank(problem_description, candidates, method)
             else:
-                score_func = partial(self.llm_score_method, problem_description)
-            method_scores = MethodScorer(score_func).process(self.method_tree)
-            method_scores.sort(key=lambda x: x['score'], reverse=True)
+                method_scores = self.score_methods(problem_description, method, self.beam_width)
             print(f"      [Method Retrieval] ✓ Retrieved {top_k} methods")
+            if method != 'llm':
+                info = self.embedding_scorer.query_cache.info()
+                print(f"      [Method Retrieval] Query embedding cache: {info['hit_rate']:.0%} hit rate "
+                      f"({info['memory_hits']} memory, {info['disk_hits']} disk, {info['misses']} misses)")
             return self.format_methods(method_scores[:top_k])
         else:
             return self.markdown_text
\ No newline at end of file
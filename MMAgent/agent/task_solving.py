@@ -2,14 +2,24 @@ from .base_agent import BaseAgent
 from prompt.template import (TASK_ANALYSIS_PROMPT, TASK_RESULT_PROMPT, TASK_ANSWER_PROMPT, 
                              TASK_FORMULAS_PROMPT, TASK_FORMULAS_CRITIQUE_PROMPT, TASK_FORMULAS_IMPROVEMENT_PROMPT, 
                              TASK_MODELING_PROMPT, TASK_MODELING_CRITIQUE_PROMPT, TASK_MODELING_IMPROVEMENT_PROMPT,
-                             TASK_CODING_PROMPT, TASK_CODING_DEBUG_PROMPT, CODE_STRUCTURE_PROMPT, 
+                             TASK_CODING_PROMPT, TASK_CODING_DEBUG_PROMPT, TASK_CODING_DEBUG_PATCH_PROMPT, FILE_OUTPUTS_DESCRIPTION_PROMPT, 
                              TASK_RESULT_WITH_CODE_PROMPT)
-import sys
+import ast
 import os
 import subprocess
 import selectors
-import tiktoken
 import json
+from utils.code_check import preflight_check, summarize_code
+from utils.file_profile import describe_file
+from utils.utils import parse_llm_output_to_json
+from utils.patch import PatchError, parse_edit_blocks, apply_edit_blocks
+from utils.workspace import TaskWorkspace
+from utils.execution_cache import snapshot_dir
+from utils.convergence import refine
+
+
+EXECUTION_HEADER = "The script has been executed. Here is the output:\n"
+PREFLIGHT_HEADER = "The script was not executed because the pre-execution check found the following problems:\n"
 
 
 class EnvException(Exception):
@@ -19,11 +29,33 @@ class EnvException(Exception):
         return self.message
     
 
-def execute_script(script_path, work_dir):
+def format_observation(stdout: str, stderr: str, return_code: int) -> str:
+    if return_code != 0:
+        observation = stderr
+    else:
+        observation = stdout
+    if observation == "" and return_code == 0:
+        # printed to stderr only
+        observation = stderr
+    return EXECUTION_HEADER + observation
+
+
+# Interpreter that runs generated scripts; pre-flight import checks resolve modules against it too.
+PYTHON = "python"
+
+
+def execute_script(script_path, work_dir, cache=None):
     try:
+        if cache:
+            cache_key = cache.key(script_path, work_dir)
+            entry = cache.load(cache_key, work_dir)
+            if entry:
+                print(f"      [Code Generation] ✓ Replayed cached execution of {script_path}")
+                return format_observation(entry['stdout'], entry['stderr'], entry['returncode'])
+            before = snapshot_dir(work_dir)
+
         device = 0
-        python = "python"
-        cmd = f"CUDA_VISIBLE_DEVICES={device} {python} -u {script_path}"
+        cmd = f"CUDA_VISIBLE_DEVICES={device} {PYTHON} -u {script_path}"
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True, cwd=work_dir)
 
         stdout_lines = []
@@ -55,23 +87,27 @@ def execute_script(script_path, work_dir):
             stderr_lines.append(line)
 
         return_code = process.returncode
-
-        if return_code != 0:
-            observation = "".join(stderr_lines)
-        else:
-            observation = "".join(stdout_lines)
-        if observation == "" and return_code == 0:
-            # printed to stderr only
-            observation = "".join(stderr_lines)
-        return "The script has been executed. Here is the output:\n" + observation
+        stdout, stderr = "".join(stdout_lines), "".join(stderr_lines)
+        if cache:
+            cache.store(cache_key, work_dir, stdout, stderr, return_code, before)
+        return format_observation(stdout, stderr, return_code)
     except Exception as e:
         print("++++", "Wrong!")
         raise EnvException(f"Something went wrong in executing {script_path}: {e}. Please check if it is ready to be executed.")
 
 
+def execution_failed(observation: str) -> bool:
+    if observation.startswith(PREFLIGHT_HEADER) or EXECUTION_HEADER not in observation:
+        return True
+    return "Traceback (most recent call last):" in observation or "SyntaxError: invalid syntax" in observation or "IndentationError" in observation
+
+
 class TaskSolver(BaseAgent):
-    def __init__(self, llm):
+    def __init__(self, llm, execution_cache=None, convergence=None):
         super().__init__(llm)
+        self.convergence = convergence
+        self.execution_cache = execution_cache
+        self.file_outputs = []
 
     def analysis(self, prompt: str, task_description: str, user_prompt: str = ''):
         print(f"    [Task Analysis] Analyzing task...")
@@ -92,25 +128,22 @@ class TaskSolver(BaseAgent):
         prompt = TASK_FORMULAS_IMPROVEMENT_PROMPT.format(data_summary=data_summary, task_description=task_description, task_analysis=task_analysis, modeling_formulas=modeling_formulas, modeling_formulas_critique=modeling_formulas_critique, user_prompt=user_prompt).strip()
         return self.llm.generate(prompt)
 
-    def modeling(self, formulas_prompt: str, modeling_prompt: str, data_summary: str, task_description: str, task_analysis: str, modeling_methods: str, round: int = 1, user_prompt: str = ''):
+    def modeling(self, formulas_prompt: str, modeling_prompt: str, data_summary: str, task_description: str, task_analysis: str, modeling_methods: str, round: int = 1, user_prompt: str = '', reference_solutions: str = 'None'):
         print(f"    [Task Formulas] Actor: Generating initial formulas...")
         formulas = self.formulas_actor(formulas_prompt, data_summary, task_description, task_analysis, modeling_methods, user_prompt)
-        for i in range(round):
-            print(f"    [Task Formulas] Round {i+1}/{round}: Critic...")
-            formulas_critique = self.formulas_critic(data_summary, task_description, task_analysis, formulas)
-            print(f"    [Task Formulas] Round {i+1}/{round}: Improvement...")
-            formulas = self.formulas_improvement(data_summary, task_description, task_analysis, formulas, formulas_critique, user_prompt)
-        if round > 0:
-            print(f"    [Task Formulas] Completed ({round} rounds)")
+        formulas = refine('Task Formulas', formulas, round,
+                          critic=lambda formulas: self.formulas_critic(data_summary, task_description, task_analysis, formulas),
+                          improve=lambda formulas, critique: self.formulas_improvement(data_summary, task_description, task_analysis, formulas, critique, user_prompt),
+                          convergence=self.convergence, indent='    ')
         
         print(f"    [Task Modeling] Actor: Generating modeling process...")
-        modeling_method = self.modeling_actor(modeling_prompt, data_summary, task_description, task_analysis, formulas, user_prompt)
+        modeling_method = self.modeling_actor(modeling_prompt, data_summary, task_description, task_analysis, formulas, user_prompt, reference_solutions)
         print(f"    [Task Modeling] Completed")
     
         return formulas, modeling_method
 
-    def modeling_actor(self, prompt: str, data_summary: str, task_description: str, task_analysis: str, formulas: str, user_prompt: str = ''):
-        prompt = TASK_MODELING_PROMPT.format(prompt=prompt, data_summary=data_summary, task_description=task_description, task_analysis=task_analysis, modeling_formulas=formulas, user_prompt=user_prompt).strip()
+    def modeling_actor(self, prompt: str, data_summary: str, task_description: str, task_analysis: str, formulas: str, user_prompt: str = '', reference_solutions: str = 'None'):
+        prompt = TASK_MODELING_PROMPT.format(prompt=prompt, data_summary=data_summary, task_description=task_description, task_analysis=task_analysis, modeling_formulas=formulas, reference_solutions=reference_solutions, user_prompt=user_prompt).strip()
         return self.llm.generate(prompt)
 
     # def modeling_critic(self, task_description: str, task_analysis: str, data_summary: str, formulas: str, modeling_process: str):
@@ -129,27 +162,26 @@ class TaskSolver(BaseAgent):
     #         process = self.modeling_improvement(task_description, task_analysis, data_summary, formulas, process, process_critique)
     #     return process
     
-    def coding_actor(self, data_file, data_summary, variable_description, task_description: str, task_analysis: str, formulas: str, modeling: str, dependent_file_prompt: str, code_template: str, script_name: str, work_dir: str, user_prompt: str = ''):
-        prompt = TASK_CODING_PROMPT.format(data_file=data_file, data_summary=data_summary, variable_description=variable_description, task_description=task_description, task_analysis=task_analysis, modeling_formulas=formulas, modeling_process=modeling, dependent_file_prompt=dependent_file_prompt, code_template=code_template, user_prompt=user_prompt).strip()
-        max_retry = 0
-        while max_retry < 5:
-            max_retry += 1
-            try:
-                completion = self.llm.generate(prompt)
-                new_content = completion.split("```python")[1].split("```")[0].strip()
-                break  
-            except Exception as e:
-                # Format control.
-                print(f"Retry! The code does not start with ```python")
-                continue
+    def run_script(self, code: str, script_name: str, work_dir: str):
+        script_path = os.path.join(work_dir, script_name)
+        # A script promoted by an earlier run is hard-linked into work_dir; unlink it instead of writing through
+        if os.path.lexists(script_path):
+            os.remove(script_path)
+        with open(script_path, "w") as f:
+            f.write(code)
+
+        # Catch syntax errors, missing modules and missing data files before running the script.
+        diagnostics = preflight_check(code, work_dir, PYTHON)
+        if diagnostics:
+            print(f"      [Code Generation] ✗ Pre-flight check found {len(diagnostics)} problem(s)")
+            return PREFLIGHT_HEADER + "\n".join(diagnostics)
 
-        with open(os.path.join(work_dir, script_name), "w") as f:
-            f.write(new_content)
-        
         # Execute the script.
+        observation = ''
         try:
-            observation = execute_script(script_name, work_dir)
+            observation = execute_script(script_name, work_dir, self.execution_cache)
             ## If observation is too long, we only keep the last ~2k tokens.
+            import tiktoken
             enc = tiktoken.get_encoding("cl100k_base")
             tokens = len(enc.encode(observation))
             if tokens >= 2000:
@@ -158,11 +190,44 @@ class TaskSolver(BaseAgent):
         except Exception as e:
             print(e)
             input("Ah oh, Got stuck! Press any key to continue.")
+        return observation
 
+    def coding_actor(self, data_file, data_summary, variable_description, task_description: str, task_analysis: str, formulas: str, modeling: str, dependent_file_prompt: str, code_template: str, script_name: str, work_dir: str, user_prompt: str = '', data_profile: str = '', reference_solutions: str = 'None'):
+        prompt = TASK_CODING_PROMPT.format(data_file=data_file, data_summary=data_summary, variable_description=variable_description, data_profile=data_profile, task_description=task_description, task_analysis=task_analysis, modeling_formulas=formulas, modeling_process=modeling, dependent_file_prompt=dependent_file_prompt, reference_solutions=reference_solutions, code_template=code_template, user_prompt=user_prompt).strip()
+        max_retry = 0
+        while max_retry < 5:
+            max_retry += 1
+            try:
+                completion = self.llm.generate(prompt)
+                new_content = completion.split("```python")[1].split("```")[0].strip()
+                break  
+            except Exception as e:
+                # Format control.
+                print(f"Retry! The code does not start with ```python")
+                continue
+
+        observation = self.run_script(new_content, script_name, work_dir)
         return new_content, observation
     
-    def coding_debugger(self, code_template: str, modeling: str, code: str, observation: str, script_name: str, work_dir: str, user_prompt: str = ''):
-        
+    def patch_debugger(self, modeling: str, code: str, observation: str, user_prompt: str = ''):
+        prompt = TASK_CODING_DEBUG_PATCH_PROMPT.format(modeling_process=modeling, code=code, observation=observation, user_prompt=user_prompt).strip()
+        completion = self.llm.generate(prompt)
+        try:
+            new_content = apply_edit_blocks(code, parse_edit_blocks(completion))
+            ast.parse(new_content)
+        except (PatchError, SyntaxError) as e:
+            print(f"      [Code Generation] ✗ Patch could not be applied ({str(e)[:50]}...), falling back to full rewrite")
+            return None
+        print(f"      [Code Generation] ✓ Patch applied")
+        return new_content
+
+    def coding_debugger(self, code_template: str, modeling: str, code: str, observation: str, script_name: str, work_dir: str, user_prompt: str = '', debug_mode: str = 'patch'):
+        if debug_mode == 'patch':
+            new_content = self.patch_debugger(modeling, code, observation, user_prompt)
+            if new_content is not None:
+                observation = self.run_script(new_content, script_name, work_dir)
+                return new_content, observation
+
         prompt = TASK_CODING_DEBUG_PROMPT.format(code_template=code_template, modeling_process=modeling, code=code, observation=observation, user_prompt=user_prompt).strip()
         
         max_retry = 0
@@ -177,55 +242,48 @@ class TaskSolver(BaseAgent):
                 print(f"Retry! The code does not start with ```python")
                 continue
 
-        with open(os.path.join(work_dir, script_name), "w") as f:
-            f.write(new_content)
-        
-        # Execute the script.
-        try:
-            observation = execute_script(script_name, work_dir)
-            ## If observation is too long, we only keep the last ~2k tokens.
-            enc = tiktoken.get_encoding("cl100k_base")
-            tokens = len(enc.encode(observation))
-            if tokens >= 2000:
-                observation = observation[:2000]
-                tokens = len(enc.encode(observation))
-        except Exception as e:
-            print(e)
-            input("Ah oh, Got stuck! Press any key to continue.")
-
+        observation = self.run_script(new_content, script_name, work_dir)
         return new_content, observation
     
-    def coding(self, data_file, data_summary, variable_description, task_description: str, task_analysis: str, formulas: str, modeling: str, dependent_file_prompt: str, code_template: str, script_name: str, work_dir: str, try_num: int = 5, round: int = 1, user_prompt: str = ''):
+    def coding(self, data_file, data_summary, variable_description, task_description: str, task_analysis: str, formulas: str, modeling: str, dependent_file_prompt: str, code_template: str, script_name: str, work_dir: str, try_num: int = 5, round: int = 1, user_prompt: str = '', debug_mode: str = 'patch', data_profile: str = '', reference_solutions: str = 'None'):
         max_iteration = 3
+        # Each candidate runs in its own overlay of work_dir; only the passing run's outputs are promoted back.
+        workspace = TaskWorkspace(work_dir, os.path.splitext(script_name)[0])
+        run_dir = None
         print(f"    [Code Generation] Starting (max {try_num} tries, {max_iteration} iterations per try)")
         for i in range(try_num):
             print("="*10 + f" [Code Generation] Try {i + 1}/{try_num} " + "="*10)
             iteration = 0
             while iteration < max_iteration:
                 print("="*10 + f" [Code Generation] Try {i + 1}/{try_num}, Iteration {iteration + 1}/{max_iteration} " + "="*10)
+                if run_dir:
+                    workspace.discard(run_dir)
+                run_dir = workspace.new_run()
                 if iteration == 0:
                     print(f"      [Code Generation] Actor: Generating code...")
-                    code, observation = self.coding_actor(data_file, data_summary, variable_description, task_description, task_analysis, formulas, modeling, dependent_file_prompt, code_template, script_name, work_dir, user_prompt)
+                    code, observation = self.coding_actor(data_file, data_summary, variable_description, task_description, task_analysis, formulas, modeling, dependent_file_prompt, code_template, script_name, run_dir, user_prompt, data_profile, reference_solutions)
                     print(f"      [Code Generation] Executing code...")
-                    # If the script has been successfully executed: Exit.
-                    if "Traceback (most recent call last):" not in observation and "SyntaxError: invalid syntax" not in observation and "IndentationError" not in observation:
-                        print(f"      [Code Generation] ✓ Success!")
-                        return code, True, observation.split("The script has been executed. Here is the output:\n")[1]
-                    else:
-                        print(f"      [Code Generation] ✗ Execution failed, will debug...")
                 else:
                     print(f"      [Code Generation] Debugger: Fixing code (iteration {iteration})...")
-                    code, observation = self.coding_debugger(code_template, modeling, code, observation, script_name, work_dir, user_prompt)
+                    code, observation = self.coding_debugger(code_template, modeling, code, observation, script_name, run_dir, user_prompt, debug_mode)
                     print(f"      [Code Generation] Re-executing code...")
-                    # If the script has been successfully executed: Exit.
-                    if "Traceback (most recent call last):" not in observation and "SyntaxError: invalid syntax" not in observation and "IndentationError" not in observation:
-                        print(f"      [Code Generation] ✓ Success!")
-                        return code, True, observation.split("The script has been executed. Here is the output:\n")[1]
-                    else:
-                        print(f"      [Code Generation] ✗ Still failed, continuing...")
+                # If the script has been successfully executed: Exit.
+                if not execution_failed(observation):
+                    print(f"      [Code Generation] ✓ Success!")
+                    self.file_outputs = workspace.promote(run_dir, workspace.outputs(run_dir))
+                    workspace.discard(run_dir)
+                    return code, True, observation.split(EXECUTION_HEADER)[1]
+                elif iteration == 0:
+                    print(f"      [Code Generation] ✗ Execution failed, will debug...")
+                else:
+                    print(f"      [Code Generation] ✗ Still failed, continuing...")
                 iteration += 1
 
         print(f"    [Code Generation] ✗ Failed after {try_num} tries")
+        self.file_outputs = []
+        if run_dir:
+            workspace.promote(run_dir, [script_name])
+            workspace.discard(run_dir)
         return code, False, None
 
     def result(self, task_description: str, task_analysis: str, task_formulas: str, task_modeling: str, user_prompt: str = '', execution_result: str = ''):
@@ -241,22 +299,30 @@ class TaskSolver(BaseAgent):
         result = self.llm.generate(prompt)
         return result
 
-    def extract_code_structure(self, task_id, code: str, save_path: str):
+    def describe_file_outputs(self, code: str, file_outputs: list):
+        prompt = FILE_OUTPUTS_DESCRIPTION_PROMPT.format(code=code, file_outputs=json.dumps(file_outputs, indent=2, ensure_ascii=False))
+        try:
+            return parse_llm_output_to_json(self.llm.generate(prompt))
+        except (ValueError, json.JSONDecodeError) as e:
+            print(f"      [Code Structure] ✗ File descriptions could not be parsed: {str(e)[:50]}...")
+            return {}
+
+    def extract_code_structure(self, task_id, code: str, save_path: str, describe_files: bool = False):
+        """
+        Build the code structure from the script's AST and the files its passing execution actually produced.
+        The LLM is only used, when describe_files is set, to add prose descriptions of those files.
+        """
         print(f"    [Code Structure] Extracting code structure...")
-        prompt = CODE_STRUCTURE_PROMPT.format(code=code, save_path=save_path)
-        count = 0
-        for i in range(5):
-            try:
-                print(f"      [Code Structure] Attempt {i+1}/5...")
-                strucutre = self.llm.generate(prompt)
-                structure_string = strucutre.strip('```json\n').strip('```')
-                structure_json = json.loads(structure_string)
-                for i in range(len(structure_json['file_outputs'])):
-                    structure_json['file_outputs'][i]['file_description'] = 'This file is generated by code for Task {}. '.format(task_id) + structure_json['file_outputs'][i]['file_description']
-                print(f"      [Code Structure] ✓ Success!")
-                return structure_json
-            except Exception as e:
-                print(f"      [Code Structure] ✗ Attempt {i+1} failed: {str(e)[:50]}...")
-                continue
-        if count == 5:
-            sys.exit("Fail at extract_code_structure")
+        structure_json = {'script_path': save_path}
+        structure_json.update(summarize_code(code))
+        work_dir = os.path.dirname(save_path)
+        script_name = os.path.basename(save_path)
+        structure_json['file_outputs'] = [
+            describe_file(path, os.path.relpath(path, work_dir))
+            for path in self.file_outputs if os.path.basename(path) != script_name and os.path.exists(path)
+        ]
+        descriptions = self.describe_file_outputs(code, structure_json['file_outputs']) if describe_files and structure_json['file_outputs'] else {}
+        for file_output in structure_json['file_outputs']:
+            file_output['file_description'] = 'This file is generated by code for Task {}. '.format(task_id) + descriptions.get(file_output['path'], '')
+        print(f"      [Code Structure] ✓ Recorded {len(structure_json['file_outputs'])} output files")
+        return structure_json
@@ -0,0 +1,23 @@
+import os
+import pandas as pd
+
+
+def load_table(path, **kwargs):
+    """
+    Load a dataset table, preferring the columnar side-car (data.parquet or data.pkl next to data.csv)
+    that the pipeline writes once per dataset file. Falls back to parsing the original file.
+    """
+    stem, extension = os.path.splitext(path)
+    if not kwargs:
+        if os.path.exists(stem + '.parquet'):
+            try:
+                return pd.read_parquet(stem + '.parquet')
+            except ImportError:
+                pass
+        if os.path.exists(stem + '.pkl'):
+            return pd.read_pickle(stem + '.pkl')
+    if extension.lower() in ('.xlsx', '.xls'):
+        return pd.read_excel(path, **kwargs)
+    if extension.lower() == '.tsv':
+        return pd.read_csv(path, sep='\t', **kwargs)
+    return pd.read_csv(path, **kwargs)
@@ -1,5 +1,8 @@
 # import necessary package
 # from ... import ...
+# Load dataset files with the provided helper, it reads the typed columnar copy when available:
+# from data_loader import load_table
+# df = load_table('data.csv')
 
 # The model class
 class Model2():
@@ -1,14 +1,17 @@
-from llm.llm import LLM
-from utils.utils import write_json_file, get_info
+from utils.utils import write_json_file, get_info, save_solution
 import time
 import argparse
-from utils.problem_analysis import problem_analysis
-from utils.mathematical_modeling import mathematical_modeling
-from utils.computational_solving import computational_solving
-from utils.solution_reporting import generate_paper
 
 
 def run(key, problem_path, config, name, dataset_path, output_dir, base_url=None):
+    # Pipeline modules are imported here so that argument parsing and --help start instantly
+    from llm.llm import LLM
+    from utils.problem_analysis import problem_analysis
+    from utils.mathematical_modeling import mathematical_modeling
+    from utils.computational_solving import computational_solving
+    from utils.solution_reporting import generate_paper
+    from utils.execution_cache import ExecutionCache
+
     # Initialize LLM
     print("="*80)
     print(f"MMAgent Starting")
@@ -30,11 +33,15 @@ def run(key, problem_path, config, name, dataset_path, output_dir, base_url=None
     print(f'Stage 2 & 3: Mathematical Modeling & Computational Solving')
     print(f'Total tasks: {len(order)}, Execution order: {order}')
     print('='*80)
+    # One cache per run, so file digests and the environment probe are shared by all tasks
+    execution_cache = ExecutionCache() if with_code and config.get('execution_cache', True) else None
     for idx, id in enumerate(order, 1):
         print(f'\n[Overall Progress] Task {idx}/{len(order)} (Task ID: {id})')
         print('-'*80)
-        task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt = mathematical_modeling(id, problem, task_descriptions, llm, config, coordinator, with_code)
-        solution = computational_solving(llm, coordinator, with_code, problem, id, task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt, config, solution, name, output_dir)
+        task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt = mathematical_modeling(id, problem, task_descriptions, llm, config, coordinator, with_code, output_dir)
+        solution = computational_solving(llm, coordinator, with_code, problem, id, task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt, config, solution, name, output_dir, execution_cache)
+    coordinator.wait_background()
+    save_solution(solution, name, output_dir)
     print('='*80)
     print('Stage 2 & 3: Mathematical Modeling & Computational Solving ✓ Completed')
     print('='*80 + '\n')
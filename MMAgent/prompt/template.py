@@ -59,6 +59,8 @@ Critically examine the analysis results of the given mathematical modeling probl
 5. Contextual Awareness: Evaluate how well the analysis situates itself within the broader landscape of mathematical modeling in this area. Does it consider previous work or developments in the field? Is there any indication of awareness of real-world implications, practical constraints, or ethical concerns, if applicable?
 
 Critique the analysis without offering any constructive suggestions—your focus should solely be on highlighting weaknesses, gaps, and limitations within the approach and its execution.
+
+End with a final line `SEVERITY: <integer from 0 to 10>` rating how substantive the remaining weaknesses are, where 0 means no substantive weaknesses remain and 10 means the work is fundamentally flawed.
 """
 
 
@@ -205,6 +207,8 @@ Critically examine the analysis results of the given mathematical modeling solut
 - Practical implementation: How would this model be implemented in practice? What would be the required infrastructure, and what challenges would need to be addressed during implementation? 
 
 Critique the analysis without offering any constructive suggestions—your focus should solely be on highlighting weaknesses, gaps, and limitations within the approach and its execution.
+
+End with a final line `SEVERITY: <integer from 0 to 10>` rating how substantive the remaining weaknesses are, where 0 means no substantive weaknesses remain and 10 means the work is fundamentally flawed.
 """
 
 
@@ -380,6 +384,8 @@ The goal of this task is to critically evaluate the modeling formulas used to re
   Evaluate the model’s practical applicability. How well does it apply to real-world problems, and to what extent does it provide actionable insights for decision-making or problem-solving in the field?  
 
 Critique the analysis without offering any constructive suggestions—your focus should solely be on highlighting weaknesses, gaps, and limitations within the formulas.
+
+End with a final line `SEVERITY: <integer from 0 to 10>` rating how substantive the remaining weaknesses are, where 0 means no substantive weaknesses remain and 10 means the work is fundamentally flawed.
 """
 
 
@@ -422,6 +428,9 @@ TASK_MODELING_PROMPT = """\
 # Task Modeling Formulas:
 {modeling_formulas}
 
+# Reference Solutions (modeling processes of similar tasks solved earlier; use them for inspiration, do not copy them):
+{reference_solutions}
+
 ---
 {prompt}
 
@@ -519,6 +528,9 @@ TASK_CODING_PROMPT = """\
 # Variable Description:
 {variable_description}
 
+# Dataset Profile (computed from the actual files; use these exact column names and types):
+{data_profile}
+
 # Other files (Generated by Other Agents):
 {dependent_file_prompt}
 
@@ -534,6 +546,9 @@ TASK_CODING_PROMPT = """\
 # Task Modeling Process:
 {modeling_process}
 
+# Reference Solutions (passing code of similar tasks solved earlier; reuse working patterns, but follow this task's data and modeling):
+{reference_solutions}
+
 # Code Template:
 {code_template}
 
@@ -587,6 +602,32 @@ Please respond exactly in the following format:
 """
 
 
+TASK_CODING_DEBUG_PATCH_PROMPT = """\
+# Modeling Process:
+{modeling_process}
+
+# Current Code:
+```python
+{code}
+```
+
+However, there are some bugs in this version. Here is the execution result:
+# Execution Result:
+{observation}
+
+---
+
+You are a helpful programming expert. Based on the provided execution result, please fix these bugs by editing the current code. Your task is to address the error indicated in the result, and only change the lines that are needed to make the code work correctly.
+{user_prompt}
+Do NOT return the whole script. Respond only with one or more edit blocks in exactly the following format:
+<<<<<<< SEARCH
+[lines copied exactly from the current code, including indentation, enough to be unique]
+=======
+[the lines that replace them]
+>>>>>>> REPLACE
+"""
+
+
 TASK_RESULT_PROMPT = """\
 # Task Description:
 {task_description}
@@ -712,6 +753,11 @@ Please create a chart that aligns closely with the above paper content while avo
 
 
 
+CHART_FOCUS_PROMPT = """\
+This chart must focus on {chart_focus}. The other charts for this paper are created separately and focus on: {other_focuses}. Do not duplicate them.
+"""
+
+
 PROBLEM_EXTRACT_PROMPT = """\
 You are tasked with extracting detailed and complete information from the following mathematical modeling question.  
 
@@ -915,6 +961,26 @@ The output format is:
 """
 
 
+FILE_OUTPUTS_DESCRIPTION_PROMPT = """\
+You are a programming expert. The following code was executed and generated the files listed below.
+The code is:
+```python
+{code}
+```
+The generated files (with their detected type, size and schema) are:
+```json
+{file_outputs}
+```
+Write a one or two sentence description of the content of each file, so that other agents can decide whether to reuse it. Only return the JSON output in the following format, no other text:
+```json
+{{
+    "file_path": "description of the file",
+    ...
+}}
+```
+"""
+
+
 PAPER_CHAPTER_PROMPT = """\
 You are tasked with creating a publication-quality LaTeX chapter for a mathematical modeling research paper. Carefully transform the provided structured draft into a coherent, rigorous, and concise narrative chapter that aligns logically and seamlessly with the previously written content.
 
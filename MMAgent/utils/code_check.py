@@ -0,0 +1,276 @@
+import ast
+import builtins
+import json
+import os
+import subprocess
+import sys
+from typing import List
+
+
+DATA_FILE_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.json', '.txt', '.tsv', '.parquet', '.feather', '.pkl', '.pickle', '.npy', '.npz', '.h5')
+IMPORT_ERRORS = ('ImportError', 'ModuleNotFoundError', 'Exception', 'BaseException')
+READ_FUNCTIONS = ('read_csv', 'read_excel', 'read_json', 'read_table', 'read_parquet', 'read_feather', 'read_pickle', 'read_hdf', 'load_table', 'load', 'loadtxt', 'genfromtxt', 'open')
+
+
+class _NameCollector(ast.NodeVisitor):
+    """Collect every name bound anywhere in the module and every name loaded."""
+
+    def __init__(self):
+        self.bound = set()
+        self.loaded = []
+        self.star_import = False
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.append(node)
+        else:
+            self.bound.add(node.id)
+
+    def visit_FunctionDef(self, node):
+        self.bound.add(node.name)
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs:
+            self.bound.add(arg.arg)
+        if args.vararg:
+            self.bound.add(args.vararg.arg)
+        if args.kwarg:
+            self.bound.add(args.kwarg.arg)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        args = node.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs:
+            self.bound.add(arg.arg)
+        if args.vararg:
+            self.bound.add(args.vararg.arg)
+        if args.kwarg:
+            self.bound.add(args.kwarg.arg)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bound.add(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.star_import = True
+            else:
+                self.bound.add(alias.asname or alias.name)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.bound.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self.bound.add(node.name)
+
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self.bound.add(node.rest)
+        self.generic_visit(node)
+
+
+# Interpreter -> modules already found importable by it, so debug rounds do not query it again
+_available_modules = {}
+
+
+def _find_missing_modules(modules: List[str], work_dir: str, python: str) -> List[str]:
+    """Ask the interpreter that will run the script which of the given top-level modules it cannot import."""
+    known = _available_modules.setdefault(python, set())
+    unknown = sorted(set(modules) - known)
+    if not unknown:
+        return []
+    probe = ("import importlib.util, json, sys\n"
+             "print(json.dumps([m for m in sys.argv[1:] if importlib.util.find_spec(m) is None]))")
+    try:
+        result = subprocess.run([python, '-c', probe, *unknown], cwd=work_dir, capture_output=True, text=True, timeout=60)
+        missing = json.loads(result.stdout.strip().splitlines()[-1])
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        # The interpreter cannot be queried: leave it to the actual execution to report missing modules.
+        return []
+    known.update(m for m in unknown if m not in missing)
+    return missing
+
+
+def _is_type_checking(test: ast.AST) -> bool:
+    return (isinstance(test, ast.Name) and test.id == 'TYPE_CHECKING') or (isinstance(test, ast.Attribute) and test.attr == 'TYPE_CHECKING')
+
+
+def _catches_import_error(handler: ast.ExceptHandler) -> bool:
+    if handler.type is None:
+        return True
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return any(isinstance(t, (ast.Name, ast.Attribute)) and (t.id if isinstance(t, ast.Name) else t.attr) in IMPORT_ERRORS for t in types)
+
+
+def _required_imports(node: ast.AST):
+    """
+    Yield the import statements a script needs at run time, skipping optional imports:
+    those in the body of a try whose handler catches ImportError, and those under `if TYPE_CHECKING:`.
+    """
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        yield node
+        return
+    if isinstance(node, ast.Try) and any(_catches_import_error(h) for h in node.handlers):
+        children = node.handlers + node.orelse + node.finalbody
+    elif isinstance(node, ast.If) and _is_type_checking(node.test):
+        children = node.orelse
+    else:
+        children = ast.iter_child_nodes(node)
+    for child in children:
+        yield from _required_imports(child)
+
+
+def _call_name(node: ast.Call) -> str:
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return ''
+
+
+def _is_read_call(node: ast.Call) -> bool:
+    name = _call_name(node)
+    if name not in READ_FUNCTIONS:
+        return False
+    if name == 'open':
+        mode = node.args[1] if len(node.args) > 1 else next((kw.value for kw in node.keywords if kw.arg == 'mode'), None)
+        if isinstance(mode, ast.Constant) and isinstance(mode.value, str) and any(flag in mode.value for flag in 'wax+'):
+            return False
+    return True
+
+
+def check_imports(tree: ast.AST, work_dir: str, python: str = 'python') -> List[str]:
+    first_lines = {}
+    for node in _required_imports(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            top_level = module.split('.')[0]
+            if top_level in sys.builtin_module_names:
+                continue
+            # Scripts of other tasks (e.g. main1.py) live next to the current script.
+            if os.path.exists(os.path.join(work_dir, top_level + '.py')) or os.path.isdir(os.path.join(work_dir, top_level)):
+                continue
+            first_lines.setdefault(top_level, node.lineno)
+    missing = set(_find_missing_modules(list(first_lines), work_dir, python))
+    return [f"Line {lineno}: ModuleNotFoundError: No module named '{module}'"
+            for module, lineno in sorted(first_lines.items(), key=lambda item: item[1]) if module in missing]
+
+
+def check_undefined_names(tree: ast.AST) -> List[str]:
+    """
+    Report names that are loaded but never bound anywhere in the script.
+    Scopes are deliberately flattened, so only obviously undefined names are reported.
+    """
+    collector = _NameCollector()
+    collector.visit(tree)
+    if collector.star_import:
+        return []
+    known = collector.bound | set(dir(builtins)) | {'__file__', '__name__', '__doc__', '__builtins__', '__spec__', '__loader__', '__package__'}
+    diagnostics = []
+    reported = set()
+    for node in collector.loaded:
+        if node.id not in known and node.id not in reported:
+            reported.add(node.id)
+            diagnostics.append(f"Line {node.lineno}: NameError: name '{node.id}' is not defined")
+    return diagnostics
+
+
+def check_data_files(tree: ast.AST, work_dir: str) -> List[str]:
+    """
+    Report data files that the script reads but that do not exist in work_dir.
+    Paths that also appear outside a read call (e.g. written by the script first) are skipped.
+    """
+    read_paths = {}
+    other_paths = set()
+    read_args = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _is_read_call(node):
+            arg = node.args[0] if node.args else None
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                read_paths.setdefault(arg.value, node.lineno)
+                read_args.add(id(arg))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in read_args:
+            other_paths.add(node.value)
+
+    diagnostics = []
+    for path, lineno in read_paths.items():
+        if not path.lower().endswith(DATA_FILE_EXTENSIONS) or path in other_paths:
+            continue
+        full_path = path if os.path.isabs(path) else os.path.join(work_dir, path)
+        if not os.path.exists(full_path):
+            available = sorted(f for f in os.listdir(work_dir) if f.lower().endswith(DATA_FILE_EXTENSIONS)) if os.path.isdir(work_dir) else []
+            diagnostics.append(f"Line {lineno}: FileNotFoundError: No such file or directory: '{path}'. Available data files: {available}")
+    return diagnostics
+
+
+def preflight_check(code: str, work_dir: str, python: str = 'python') -> List[str]:
+    """
+    Statically check a generated script before it is executed.
+
+    Args:
+        code (str): Source code of the script.
+        work_dir (str): Directory the script will be executed in.
+        python (str): Interpreter that will run the script, used to resolve its imports.
+
+    Returns:
+        list: Diagnostics in the form "Line N: ErrorType: message". An empty list means the check passed.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [f"Line {e.lineno}: {type(e).__name__}: {e.msg}\n    {(e.text or '').rstrip()}"]
+    return check_imports(tree, work_dir, python) + check_undefined_names(tree) + check_data_files(tree, work_dir)
+
+
+def _function_structure(node) -> dict:
+    args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+    return {
+        'name': node.name,
+        'description': (ast.get_docstring(node) or '').split('\n')[0],
+        'parameters': [{'name': arg.arg, 'type': ast.unparse(arg.annotation) if arg.annotation else ''} for arg in args if arg.arg not in ('self', 'cls')],
+    }
+
+
+def summarize_code(code: str) -> dict:
+    """Extract the top-level classes and functions of a script (names, first docstring line, parameters)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return {'class': [], 'function': []}
+    classes, functions = [], []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            classes.append({
+                'name': node.name,
+                'description': (ast.get_docstring(node) or '').split('\n')[0],
+                'class_functions': [_function_structure(n) for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))],
+            })
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(_function_structure(node))
+    return {'class': classes, 'function': functions}
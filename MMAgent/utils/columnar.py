@@ -0,0 +1,72 @@
+import os
+from typing import List
+from utils.file_profile import file_sha256
+from utils.workspace import link_file
+
+
+LOADER_PATH = 'MMAgent/code_template/data_loader.py'
+
+
+def sidecar_format() -> str:
+    """Parquet when pyarrow is installed, otherwise a pandas pickle, which needs no extra dependency."""
+    try:
+        import pyarrow  # noqa: F401
+        return 'parquet'
+    except ImportError:
+        return 'pkl'
+
+
+def _write_sidecar(source: str, target: str, fmt: str):
+    import pandas as pd
+
+    extension = os.path.splitext(source)[1].lower()
+    if extension in ('.xlsx', '.xls'):
+        frame = pd.read_excel(source)
+    else:
+        frame = pd.read_csv(source, sep='\t' if extension == '.tsv' else ',', low_memory=False)
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    if fmt == 'parquet':
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_pickle(tmp_path)
+    os.replace(tmp_path, target)
+
+
+def convert_dataset(dataset_dir: str, shared_dir: str, cache_dir: str = 'MMAgent/cache/columnar') -> List[str]:
+    """
+    Convert each CSV/TSV/Excel table of the dataset once into a typed columnar side-car and clone it
+    next to the original file in shared_dir (data.csv -> data.parquet). Side-cars are cached by the
+    source file hash, so later runs on the same dataset only copy them.
+
+    Returns:
+        list: Relative paths of the side-cars available in shared_dir.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fmt = sidecar_format()
+    sidecars = []
+    for root, _, files in os.walk(dataset_dir):
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            if extension.lower() not in ('.csv', '.tsv', '.xlsx', '.xls') or f'{stem}.{fmt}' in files:
+                continue
+            source = os.path.join(root, name)
+            cached = os.path.join(cache_dir, f'{file_sha256(source)}.{fmt}')
+            if not os.path.exists(cached):
+                print(f"  [Columnar Conversion] Converting {name} to {fmt}...")
+                try:
+                    _write_sidecar(source, cached, fmt)
+                except (OSError, ValueError, ImportError) as e:
+                    print(f"  [Columnar Conversion] ✗ Could not convert {name}: {str(e)[:50]}...")
+                    continue
+            rel_path = os.path.join(os.path.relpath(root, dataset_dir), f'{stem}.{fmt}')
+            link_file(cached, os.path.join(shared_dir, rel_path))
+            sidecars.append(os.path.normpath(rel_path))
+    return sidecars
+
+
+def install_data_loader(shared_dir: str):
+    """
+    Copy the data_loader helper imported by the code templates into shared_dir. It is needed even
+    without side-cars, since load_table falls back to reading the original file.
+    """
+    link_file(LOADER_PATH, os.path.join(shared_dir, os.path.basename(LOADER_PATH)))
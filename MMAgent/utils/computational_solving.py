@@ -1,13 +1,18 @@
 import os
-from utils.utils import save_solution
+from utils.utils import append_solution_record, save_solution_manifest
 from agent.task_solving import TaskSolver
 from agent.create_charts import ChartCreator
+from utils.embedding import get_embedding_scorer
+from utils.solution_memory import reference_solutions
 
 
-def computational_solving(llm, coordinator, with_code, problem, task_id, task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt, config, solution, name, output_dir):
+def computational_solving(llm, coordinator, with_code, problem, task_id, task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt, config, solution, name, output_dir, execution_cache=None):
     print(f"[Stage 3] Task {task_id}: Computational Solving")
-    ts = TaskSolver(llm)
-    cc = ChartCreator(llm)
+    ts = TaskSolver(llm, execution_cache=execution_cache)
+    if config.get('chart_mode', 'parallel') == 'parallel':
+        cc = ChartCreator(llm, embedding_scorer=get_embedding_scorer(backend=config.get('embedding_backend', 'fp32'), num_threads=config.get('embedding_threads'), dimension=config.get('embedding_dimension', 768)))
+    else:
+        cc = ChartCreator(llm)
     code_template = open(os.path.join('MMAgent/code_template','main{}.py'.format(task_id))).read()
     save_path = os.path.join(output_dir,'code/main{}.py'.format(task_id))
     work_dir = os.path.join(output_dir,'code')
@@ -15,14 +20,15 @@ def computational_solving(llm, coordinator, with_code, problem, task_id, task_de
 
     if with_code:
         print(f"  [Task {task_id}] Step 1: Code Generation & Execution...")
-        task_code, is_pass, execution_result = ts.coding(problem['dataset_path'], problem['data_description'], problem['variable_description'], task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt, code_template, script_name, work_dir)
+        reference_code = reference_solutions(config, task_description, 'task_code', output_dir)
+        task_code, is_pass, execution_result = ts.coding(problem['dataset_path'], problem['data_description'], problem['variable_description'], task_description, task_analysis, task_modeling_formulas, task_modeling_method, dependent_file_prompt, code_template, script_name, work_dir, debug_mode=config.get('debug_mode', 'patch'), data_profile=problem.get('data_profile', ''), reference_solutions=reference_code)
         if is_pass:
             print(f"  [Task {task_id}] Step 1: Code Generation & Execution ✓ Completed")
         else:
             print(f"  [Task {task_id}] Step 1: Code Generation & Execution ✗ Failed")
         
         print(f"  [Task {task_id}] Step 2: Extracting Code Structure...")
-        code_structure = ts.extract_code_structure(task_id, task_code, save_path)
+        code_structure = ts.extract_code_structure(task_id, task_code, save_path, describe_files=config.get('describe_file_outputs', False))
         
         print(f"  [Task {task_id}] Step 3: Result Interpretation...")
         task_result = ts.result(task_description, task_analysis, task_modeling_formulas, task_modeling_method, execution_result)
@@ -56,13 +62,23 @@ def computational_solving(llm, coordinator, with_code, problem, task_id, task_de
             'subtask_outcome_analysis': task_answer
         }
     
-    print(f"  [Task {task_id}] Step {4 if with_code else 3}: Chart Generation (generating {config['chart_num']} charts)...")
-    charts = cc.create_charts(str(task_dict), config['chart_num'])
-    task_dict['charts'] = charts
-    
+    # No downstream task reads the charts, so they are generated in the background and merged in when ready.
+    print(f"  [Task {task_id}] Step {4 if with_code else 3}: Chart Generation (generating {config['chart_num']} charts in the background)...")
+    create_charts = cc.create_charts_parallel if config.get('chart_mode', 'parallel') == 'parallel' else cc.create_charts
+    paper_content = str(task_dict)
+    task_dict['charts'] = []
+
     print(f"  [Task {task_id}] Saving solution...")
     coordinator.memory[str(task_id)] = task_dict
     solution['tasks'].append(task_dict)
-    save_solution(solution, name, output_dir)
+    index = len(solution['tasks']) - 1
+    append_solution_record({'index': index, 'task_id': task_id, 'task': task_dict}, name, output_dir)
+    save_solution_manifest(solution, name, output_dir)
+
+    def generate_and_merge_charts():
+        task_dict['charts'] = create_charts(paper_content, config['chart_num'])
+        append_solution_record({'index': index, 'update': {'charts': task_dict['charts']}}, name, output_dir)
+        print(f"  [Task {task_id}] ✓ Charts merged into solution")
+    coordinator.submit_background(generate_and_merge_charts)
     print(f"[Stage 3] Task {task_id}: Computational Solving ✓ All steps completed\n")
-    return solution
\ No newline at end of file
+    return solution
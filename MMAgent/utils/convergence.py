@@ -0,0 +1,80 @@
+import re
+from typing import Callable, Optional
+
+
+SEVERITY_PATTERN = re.compile(r'SEVERITY\W*(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+def critique_severity(critique: str) -> Optional[float]:
+    """The last 'SEVERITY: n' rating (0-10) reported by a critique, or None if it is missing."""
+    matches = SEVERITY_PATTERN.findall(critique)
+    return float(matches[-1]) if matches else None
+
+
+class ConvergenceMonitor:
+    """
+    Decides when an actor-critic-improvement loop has converged:
+    - the critique rates the remaining weaknesses at or below severity_threshold, so the improvement
+      call of that round and all later rounds are skipped; or
+    - an improvement barely changed the draft (cosine similarity of successive drafts at or above
+      similarity_threshold, needs an embedding scorer), so later rounds are skipped.
+    """
+
+    def __init__(self, severity_threshold: Optional[float] = 2, similarity_threshold: Optional[float] = None, embedding_scorer=None):
+        self.severity_threshold = severity_threshold
+        self.similarity_threshold = similarity_threshold
+        self.embedding_scorer = embedding_scorer
+
+    @classmethod
+    def from_config(cls, config: dict):
+        if not config.get('critic_early_exit', True):
+            return None
+        similarity_threshold = config.get('critic_similarity_threshold')
+        embedding_scorer = None
+        if similarity_threshold is not None:
+            from utils.embedding import get_embedding_scorer
+            embedding_scorer = get_embedding_scorer(backend=config.get('embedding_backend', 'fp32'), num_threads=config.get('embedding_threads'),
+                                                    dimension=config.get('embedding_dimension', 768))
+        return cls(config.get('critic_severity_threshold', 2), similarity_threshold, embedding_scorer)
+
+    def critique_converged(self, critique: str) -> Optional[str]:
+        severity = critique_severity(critique)
+        if self.severity_threshold is not None and severity is not None and severity <= self.severity_threshold:
+            return f"critique severity {severity:g} <= {self.severity_threshold:g}"
+        return None
+
+    def drafts_converged(self, previous: str, current: str) -> Optional[str]:
+        if self.similarity_threshold is None or self.embedding_scorer is None:
+            return None
+        embeddings = self.embedding_scorer.embed([previous, current])
+        similarity = float(embeddings[0] @ embeddings[1])
+        if similarity >= self.similarity_threshold:
+            return f"draft similarity {similarity:.3f} >= {self.similarity_threshold:g}"
+        return None
+
+
+def refine(name: str, draft: str, rounds: int, critic: Callable[[str], str], improve: Callable[[str, str], str],
+           convergence: Optional[ConvergenceMonitor] = None, indent: str = '  ') -> str:
+    """
+    Run up to `rounds` critic -> improvement rounds on a draft, stopping early once the
+    convergence monitor reports convergence, and report the rounds run and skipped.
+    """
+    rounds_run = 0
+    reason = None
+    for i in range(rounds):
+        print(f"{indent}[{name}] Round {i+1}/{rounds}: Critic...")
+        critique = critic(draft)
+        reason = convergence.critique_converged(critique) if convergence else None
+        if reason:
+            break
+        print(f"{indent}[{name}] Round {i+1}/{rounds}: Improvement...")
+        improved = improve(draft, critique)
+        rounds_run += 1
+        reason = convergence.drafts_converged(draft, improved) if convergence else None
+        draft = improved
+        if reason:
+            break
+    if rounds > 0:
+        skipped = rounds - rounds_run
+        print(f"{indent}[{name}] Completed ({rounds_run} rounds run, {skipped} skipped{': ' + reason if reason and skipped else ''})")
+    return draft
@@ -1,6 +1,5 @@
 import json
 import re
-import pypandoc
 
 # A sample Markdown string
 markdown_text = """
@@ -14,6 +13,8 @@ Some **bold** text here, and some *italic* text there.
 
 
 def markdown_to_latex(markdown_text):
+    import pypandoc
+
     # Convert Markdown string to LaTeX
     latex_text = pypandoc.convert_text(markdown_text, to='latex', format='md')
     return latex_text
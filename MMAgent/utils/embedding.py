@@ -1,8 +1,78 @@
-from typing import List
-import numpy as np
-import torch
-import torch.nn.functional as F
-from transformers import AutoModel, AutoTokenizer
+import hashlib
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from typing import List, TYPE_CHECKING
+from functools import lru_cache
+
+# torch and transformers take seconds to import, so they are only imported when a scorer is created or used.
+if TYPE_CHECKING:
+    import torch
+
+class QueryEmbeddingCache:
+    """
+    Two-level cache of query embeddings: an in-memory LRU in front of one file per query on disk.
+    Keys are the sha256 of the model id and the whitespace-normalized query text, so repeated
+    queries across resumed runs, config sweeps and model comparisons skip the encoder.
+    """
+
+    def __init__(self, model_id: str, cache_dir: str = 'MMAgent/cache/query_embeddings', maxsize: int = 256):
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, text: str) -> str:
+        normalized = re.sub(r'\s+', ' ', text).strip()
+        return hashlib.sha256(f"{self.model_id}\n{normalized}".encode()).hexdigest()
+
+    def get(self, key: str):
+        import torch
+
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self.memory[key]
+        path = os.path.join(self.cache_dir, f"{key}.pt")
+        if not os.path.exists(path):
+            with self.lock:
+                self.stats['misses'] += 1
+            return None
+        embedding = torch.load(path)
+        with self.lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding):
+        import torch
+
+        path = os.path.join(self.cache_dir, f"{key}.pt")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        torch.save(embedding, tmp_path)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self._remember(key, embedding)
+
+    def _remember(self, key, embedding):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def info(self) -> dict:
+        """Hit counters and the overall hit rate."""
+        with self.lock:
+            lookups = sum(self.stats.values())
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            return dict(self.stats, lookups=lookups, hit_rate=hits / lookups if lookups else 0.0)
+
 
 class EmbeddingScorer:
     """
@@ -10,18 +80,76 @@ class EmbeddingScorer:
     Uses the gte-multilingual-base model from Alibaba-NLP.
     """
     
-    def __init__(self, model_name='Alibaba-NLP/gte-multilingual-base'):
+    def __init__(self, model_name='Alibaba-NLP/gte-multilingual-base', backend='fp32', num_threads=None, dimension=768):
         """
         Initialize the EmbeddingScorer with the specified model.
         
         Args:
             model_name (str): Name of the model to use.
+            backend (str): Inference path on CPU: 'fp32' (default), 'int8' (dynamic quantization of the
+                Linear layers) or 'onnx' (ONNX Runtime through optimum; falls back to fp32 if unavailable).
+            num_threads (int): Intra-op threads used by torch / ONNX Runtime. None keeps the library default.
+            dimension (int): Embedding size. Values below 768 keep the leading Matryoshka dimensions of the
+                CLS vector before normalization, trading a little accuracy for smaller and faster vectors.
         """
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
         # Load the tokenizer and model
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
-        self.dimension = 768  # The output dimension of the embedding
-    
+        self.backend = backend
+        if backend == 'onnx':
+            self.model = self._load_onnx(model_name, num_threads)
+        if self.backend != 'onnx':
+            self.model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+            self.model.eval()
+        if self.backend == 'int8':
+            try:
+                self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            except Exception as e:
+                print(f"[Embedding] ✗ int8 quantization failed ({str(e)[:80]}), falling back to fp32")
+                self.backend = 'fp32'
+        self.dimension = dimension  # The output dimension of the embedding
+        # int8 and ONNX embeddings differ slightly from fp32, so each backend gets its own entries
+        self.query_cache = QueryEmbeddingCache(f"{model_name}:{self.backend}:{self.dimension}")
+
+    def _load_onnx(self, model_name, num_threads, cache_dir='MMAgent/cache/onnx'):
+        """
+        Load the ONNX export of the model from cache_dir, exporting it there on first use. Falls back
+        to fp32 when optimum[onnxruntime] is missing or the export fails.
+        """
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+        except ImportError:
+            print("[Embedding] ✗ optimum[onnxruntime] is not installed, falling back to fp32")
+            self.backend = 'fp32'
+            return None
+        session_options = onnxruntime.SessionOptions()
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        export_dir = os.path.join(cache_dir, re.sub(r'[^\w.-]+', '--', model_name))
+        try:
+            if os.path.isdir(export_dir):
+                return ORTModelForFeatureExtraction.from_pretrained(export_dir, session_options=session_options)
+            print(f"[Embedding] Exporting {model_name} to ONNX (once, cached in {export_dir})...")
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True, trust_remote_code=True, session_options=session_options)
+            tmp_dir = f"{export_dir}.{os.getpid()}.tmp"
+            model.save_pretrained(tmp_dir)
+            try:
+                os.replace(tmp_dir, export_dir)
+            except OSError:
+                # Another process finished the same export first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return model
+        except Exception as e:
+            print(f"[Embedding] ✗ ONNX export failed ({str(e)[:80]}), falling back to fp32")
+            self.backend = 'fp32'
+            return None
+
     def score_method(self, query: str, methods: List[dict]) -> List[dict]:
         """
         Calculate similarity between a query and a list of methods.
@@ -33,44 +161,95 @@ class EmbeddingScorer:
         Returns:
             list: List of similarity scores between the query and each method.
         """
-        # Prepare sentences
         sentences = [f"{method['method']}: {method.get('description', '')}" for method in methods]
-        texts = [query] + sentences
-        
-        # Tokenize the input texts
-        batch_dict = self.tokenizer(texts, max_length=8192, padding=True, truncation=True, return_tensors='pt')
-        
-        # Get embeddings
-        with torch.no_grad():
-            outputs = self.model(**batch_dict)
-            
-        # Get embeddings from the last hidden state
-        embeddings = outputs.last_hidden_state[:, 0][:self.dimension]
-        
-        # Normalize embeddings
-        embeddings = F.normalize(embeddings, p=2, dim=1)
-        
-        # Calculate similarities
-        query_embedding = embeddings[0].unsqueeze(0)  # Shape: [1, dimension]
-        method_embeddings = embeddings[1:]  # Shape: [num_methods, dimension]
-        
-        # Calculate cosine similarities (scaled by 100 as in the example)
-        similarities = (query_embedding @ method_embeddings.T) * 100
-        similarities = similarities.squeeze().tolist()
-        
-        # If only one method, similarities will be a scalar
-        if not isinstance(similarities, list):
-            similarities = [similarities]
-        
-        # Format results
-        result = []
-        for i, similarity in enumerate(similarities, start=1):
-            result.append({
-                "method_index": i,
-                "score": float(similarity)
-            })
-        
-        return result
+        # The query embedding comes from the cache; only the methods go through the model
+        similarities = (self.embed(sentences) @ self.embed_query(query)) * 100
+        return [{"method_index": i, "score": score} for i, score in enumerate(similarities.tolist(), start=1)]
+
+    def score_matrix(self, queries: List[str], documents: List[str], dimension: int = None) -> 'torch.Tensor':
+        """
+        Score many queries against many documents in one pass.
+
+        Args:
+            queries (list): Query texts; embeddings are served from the query cache when available.
+            documents (list): Document texts.
+            dimension (int): Optional Matryoshka dimension below the scorer's own.
+
+        Returns:
+            torch.Tensor: Cosine similarities x 100 (the scale of score_method), shape [len(queries), len(documents)].
+        """
+        import torch
+
+        query_embeddings = torch.stack([self.embed_query(query) for query in queries])
+        return (truncate_embeddings(query_embeddings, dimension) @ self.embed(documents, dimension).T) * 100
+
+    def topk(self, queries: List[str], documents: List[str], k: int = 6, dimension: int = None):
+        """
+        Best k documents for every query.
+
+        Returns:
+            tuple: (scores, indices), both of shape [len(queries), min(k, len(documents))], best first.
+        """
+        import torch
+
+        scores = self.score_matrix(queries, documents, dimension)
+        return torch.topk(scores, min(k, scores.shape[1]), dim=1)
+
+    def embed_query(self, query: str) -> 'torch.Tensor':
+        """
+        Embed a retrieval query, reusing the cached embedding of an identical (whitespace-normalized) query.
+
+        Returns:
+            torch.Tensor: L2-normalized embedding of shape [dimension].
+        """
+        key = self.query_cache.key(query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embed([query])[0]
+            self.query_cache.put(key, embedding)
+        return embedding
+
+    def embed(self, texts: List[str], dimension: int = None, batch_size: int = 32) -> 'torch.Tensor':
+        """
+        Embed texts with CLS pooling, in batches so long lists do not pad everything to the longest text.
+
+        Args:
+            texts (list): Texts to embed.
+            dimension (int): Optional Matryoshka dimension below the scorer's own.
+            batch_size (int): Texts per forward pass.
+
+        Returns:
+            torch.Tensor: L2-normalized embeddings of shape [len(texts), dimension].
+        """
+        import torch
+        import torch.nn.functional as F
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch_dict = self.tokenizer(texts[start:start + batch_size], max_length=8192, padding=True, truncation=True, return_tensors='pt')
+            with torch.no_grad():
+                outputs = self.model(**batch_dict)
+            # CLS token of every input, leading dimensions only: [batch, dimension]
+            batches.append(outputs.last_hidden_state[:, 0, :dimension or self.dimension])
+        if not batches:
+            return torch.zeros((0, dimension or self.dimension))
+        return F.normalize(torch.cat(batches), p=2, dim=1)
+
+
+def truncate_embeddings(embeddings: 'torch.Tensor', dimension: int = None) -> 'torch.Tensor':
+    """Keep the leading Matryoshka dimensions of normalized embeddings and renormalize them."""
+    import torch.nn.functional as F
+
+    if dimension is None or dimension >= embeddings.shape[-1]:
+        return embeddings
+    return F.normalize(embeddings[..., :dimension], p=2, dim=-1)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_scorer(model_name='Alibaba-NLP/gte-multilingual-base', backend='fp32', num_threads=None, dimension=768) -> EmbeddingScorer:
+    """Return a process-wide EmbeddingScorer per configuration so the model is loaded only once."""
+    return EmbeddingScorer(model_name, backend=backend, num_threads=num_threads, dimension=dimension)
+
 
 if __name__ == "__main__":
     es = EmbeddingScorer()
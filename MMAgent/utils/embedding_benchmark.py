@@ -0,0 +1,79 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import List
+
+# Run as a script from the repository root: resolve imports against MMAgent/ instead of this directory, which holds utils.py
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from agent.retrieve_method import load_method_tree
+from utils.embedding import EmbeddingScorer
+
+
+def load_queries(output_dir: str = 'MMAgent/output', limit: int = 20) -> List[str]:
+    """Retrieval queries (task description + analysis) rebuilt from saved solutions."""
+    queries = []
+    for path in sorted(glob.glob(os.path.join(output_dir, '*', '*', 'json', '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            solution = json.load(f)
+        for task in solution.get('tasks', []):
+            if task.get('task_description'):
+                queries.append(f"## Task Description\n{task['task_description']}\n\n## Task Analysis\n{task.get('task_analysis', '')}")
+    return queries[:limit]
+
+
+def leaf_methods(nodes) -> List[dict]:
+    methods = []
+    for node in nodes:
+        if node.get('children'):
+            methods += leaf_methods(node['children'])
+        elif 'method' in node:
+            methods.append({"method": node['method'], "description": node.get('description', '')})
+    return methods
+
+
+def rank_methods(scorer: EmbeddingScorer, queries: List[str], methods: List[dict], batch_size: int):
+    """
+    Return per-query method rankings and the mean latency of scoring all methods for one query.
+    Queries are encoded with embed() rather than embed_query(), so the query cache never hides encoding time.
+    """
+    sentences = [f"{method['method']}: {method['description']}" for method in methods]
+    rankings = []
+    start = time.perf_counter()
+    for query in queries:
+        scores = (scorer.embed(sentences, batch_size=batch_size) @ scorer.embed([query])[0]).tolist()
+        rankings.append(sorted(range(len(methods)), key=lambda j: scores[j], reverse=True))
+    return rankings, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare embedding backends with the fp32 baseline on method retrieval.')
+    parser.add_argument('--backends', nargs='+', default=['int8', 'onnx'])
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--top_k', type=int, default=6)
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    queries = load_queries(limit=args.queries)
+    if not queries:
+        sys.exit('No saved solutions found under MMAgent/output to build queries from.')
+    methods = leaf_methods(load_method_tree())
+    print(f"{len(queries)} queries x {len(methods)} methods, threads={args.threads or 'default'}")
+
+    baseline, baseline_latency = rank_methods(EmbeddingScorer(num_threads=args.threads), queries, methods, args.batch_size)
+    print(f"fp32: {baseline_latency:.3f}s/query")
+    for backend in args.backends:
+        scorer = EmbeddingScorer(backend=backend, num_threads=args.threads)
+        if scorer.backend != backend:
+            continue
+        rankings, latency = rank_methods(scorer, queries, methods, args.batch_size)
+        overlap = sum(len(set(a[:args.top_k]) & set(b[:args.top_k])) for a, b in zip(baseline, rankings)) / (args.top_k * len(queries))
+        print(f"{backend}: {latency:.3f}s/query ({baseline_latency / latency:.2f}x), top-{args.top_k} overlap {overlap:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, Optional
+
+
+def _stat_signature(stat_result):
+    return (stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def snapshot_dir(work_dir: str) -> Dict[str, tuple]:
+    """Map every file under work_dir (relative path) to its (inode, size, mtime) signature."""
+    snapshot = {}
+    for root, dirs, files in os.walk(work_dir):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        for name in files:
+            path = os.path.join(root, name)
+            snapshot[os.path.normpath(os.path.relpath(path, work_dir))] = _stat_signature(os.stat(path))
+    return snapshot
+
+
+def _write_atomic(path: str, content: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ExecutionCache:
+    """
+    Content-addressed cache of script executions.
+
+    An entry is keyed by the script content, the content of every other file in the work
+    directory, the interpreter and its installed packages, so any changed input file or package
+    upgrade produces a new key. Entries store stdout, stderr, the exit status and the files the
+    execution created or modified.
+    """
+
+    def __init__(self, cache_dir: str = 'MMAgent/cache/execution', python: str = 'python'):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.environment = self._environment_id(python)
+        self._digests = {}
+
+    def _environment_id(self, python: str) -> str:
+        executable = shutil.which(python) or python
+        real_path = os.path.realpath(executable)
+        mtime = os.stat(real_path).st_mtime_ns if os.path.exists(real_path) else 0
+        return f"{real_path}:{mtime}:{os.environ.get('VIRTUAL_ENV', '')}:{self._packages_digest(executable)}"
+
+    @staticmethod
+    def _packages_digest(python: str) -> str:
+        """Hash of the distributions (name==version) installed for the interpreter, so installs and upgrades change the key."""
+        probe = ("import importlib.metadata as m\n"
+                 "print('\\n'.join(sorted(f\"{d.metadata['Name']}=={d.version}\" for d in m.distributions())))")
+        try:
+            result = subprocess.run([python, '-c', probe], capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.SubprocessError):
+            return ''
+        return hashlib.sha256(result.stdout.encode()).hexdigest()[:16]
+
+    def file_digest(self, path: str) -> str:
+        # The digest is memoized per path, inode, size and mtime, so an unchanged file is hashed only once.
+        # The path is part of the key because inodes of deleted run directories are reused.
+        signature = (os.path.realpath(path),) + _stat_signature(os.stat(path))
+        digest = self._digests.get(signature)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._digests[signature] = digest
+        return digest
+
+    def key(self, script_path: str, work_dir: str) -> str:
+        script_rel = os.path.normpath(script_path)
+        h = hashlib.sha256()
+        h.update(self.environment.encode())
+        h.update(script_rel.encode())
+        h.update(self.file_digest(os.path.join(work_dir, script_path)).encode())
+        for rel_path in sorted(snapshot_dir(work_dir)):
+            if rel_path != script_rel:
+                h.update(f"\n{rel_path}:{self.file_digest(os.path.join(work_dir, rel_path))}".encode())
+        return h.hexdigest()
+
+    def load(self, key: str, work_dir: str) -> Optional[dict]:
+        """Return the cached entry and restore its output files into work_dir, or None on a miss."""
+        entry_path = os.path.join(self.cache_dir, f'{key}.json')
+        if not os.path.exists(entry_path):
+            return None
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if not all(os.path.exists(os.path.join(self.objects_dir, digest)) for digest in entry['outputs'].values()):
+            return None
+        for rel_path, digest in entry['outputs'].items():
+            dst = os.path.join(work_dir, rel_path)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.lexists(dst):
+                os.remove(dst)
+            shutil.copyfile(os.path.join(self.objects_dir, digest), dst)
+        return entry
+
+    def store(self, key: str, work_dir: str, stdout: str, stderr: str, returncode: int, before: Dict[str, tuple]):
+        outputs = {}
+        for rel_path, signature in snapshot_dir(work_dir).items():
+            if before.get(rel_path) == signature:
+                continue
+            path = os.path.join(work_dir, rel_path)
+            digest = self.file_digest(path)
+            object_path = os.path.join(self.objects_dir, digest)
+            if not os.path.exists(object_path):
+                fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix='.tmp')
+                os.close(fd)
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, object_path)
+            outputs[rel_path] = digest
+        entry = {'stdout': stdout, 'stderr': stderr, 'returncode': returncode, 'outputs': outputs}
+        _write_atomic(os.path.join(self.cache_dir, f'{key}.json'), json.dumps(entry, ensure_ascii=False))
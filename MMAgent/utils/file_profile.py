@@ -0,0 +1,169 @@
+import csv
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+
+def _infer_type(values: List[str]) -> str:
+    values = [v for v in values if v not in ('', 'NA', 'NaN', 'nan', 'null', 'None')]
+    if not values:
+        return 'empty'
+    for cast, name in ((int, 'int'), (float, 'float')):
+        try:
+            for v in values:
+                cast(v)
+            return name
+        except ValueError:
+            continue
+    if all(v.lower() in ('true', 'false') for v in values):
+        return 'bool'
+    return 'str'
+
+
+def sniff_csv(path: str, sample_rows: int = 200, delimiter: str = ',') -> dict:
+    """Read the header and the first rows of a CSV to get column names and dtypes, then stream the rest to count rows."""
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        columns = next(reader, [])
+        samples = [row for _, row in zip(range(sample_rows), reader)]
+        row_count = len(samples) + sum(1 for _ in reader)
+    dtypes = {column: _infer_type([row[i] for row in samples if i < len(row)]) for i, column in enumerate(columns)}
+    return {'column_name': columns, 'dtypes': dtypes, 'row_count': row_count}
+
+
+def sniff_json(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return {'json_type': 'object', 'keys': list(data.keys())[:50]}
+    if isinstance(data, list):
+        info = {'json_type': 'array', 'length': len(data)}
+        if data and isinstance(data[0], dict):
+            info['item_keys'] = list(data[0].keys())[:50]
+        return info
+    return {'json_type': type(data).__name__}
+
+
+def describe_file(path: str, rel_path: str = None) -> dict:
+    """
+    Describe a file produced by a script without asking the LLM.
+
+    Args:
+        path (str): Path of the file on disk.
+        rel_path (str): Path recorded in the description, relative to the work directory.
+
+    Returns:
+        dict: path, file_type and size_bytes, plus columns/dtypes/row_count for CSV and keys/length for JSON.
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    info = {
+        'path': rel_path or path,
+        'file_type': extension or 'unknown',
+        'size_bytes': os.path.getsize(path),
+    }
+    try:
+        if extension in ('csv', 'tsv'):
+            info.update(sniff_csv(path, delimiter='\t' if extension == 'tsv' else ','))
+        elif extension == 'json':
+            info.update(sniff_json(path))
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        info['sniff_error'] = str(e)[:100]
+    return info
+
+
+TABLE_EXTENSIONS = ('.csv', '.tsv', '.xlsx', '.xls')
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _profile_frames(frames) -> dict:
+    """Accumulate schema, null counts, numeric ranges and a few samples over an iterable of DataFrames."""
+    import pandas as pd
+
+    rows = 0
+    columns = {}
+    for frame in frames:
+        rows += len(frame)
+        for name in frame.columns:
+            series = frame[name]
+            column = columns.setdefault(str(name), {'dtype': str(series.dtype), 'null_count': 0, 'min': None, 'max': None, 'samples': []})
+            if column['dtype'] != str(series.dtype):
+                column['dtype'] = 'object'
+            column['null_count'] += int(series.isna().sum())
+            if pd.api.types.is_numeric_dtype(series) and series.notna().any():
+                low, high = [getattr(v, 'item', lambda: v)() for v in (series.min(), series.max())]
+                column['min'] = low if column['min'] is None else min(column['min'], low)
+                column['max'] = high if column['max'] is None else max(column['max'], high)
+            if len(column['samples']) < 3:
+                column['samples'] += [str(v)[:50] for v in series.dropna().unique()[:3 - len(column['samples'])]]
+    for column in columns.values():
+        column['null_rate'] = round(column.pop('null_count') / rows, 4) if rows else 0.0
+    return {'row_count': rows, 'columns': columns}
+
+
+def profile_table(path: str, chunksize: int = 100000) -> dict:
+    """
+    Profile a CSV/TSV (streamed in chunks) or Excel file (per sheet).
+
+    Returns:
+        dict: For every table, the row count and per-column dtype, null rate, numeric min/max and sample values.
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.csv', '.tsv'):
+        reader = pd.read_csv(path, sep='\t' if extension == '.tsv' else ',', chunksize=chunksize, low_memory=False, encoding_errors='replace')
+        return {'tables': {os.path.basename(path): _profile_frames(reader)}}
+    sheets = pd.read_excel(path, sheet_name=None)
+    return {'tables': {f'{os.path.basename(path)}[{sheet}]': _profile_frames([frame]) for sheet, frame in sheets.items()}}
+
+
+def profile_dataset(dataset_dir: str, cache_dir: str = 'MMAgent/cache/dataset_profile') -> Dict[str, dict]:
+    """
+    Profile every table in dataset_dir. Profiles are cached by file content hash, so an unchanged
+    dataset is never re-read after the first run.
+
+    Returns:
+        dict: Relative file path -> profile.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    profiles = {}
+    for root, _, files in os.walk(dataset_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(TABLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            cache_path = os.path.join(cache_dir, file_sha256(path) + '.json')
+            if os.path.exists(cache_path):
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            else:
+                try:
+                    profile = profile_table(path)
+                except (OSError, ValueError, ImportError) as e:
+                    print(f"  [Dataset Profile] ✗ Could not profile {name}: {str(e)[:50]}...")
+                    continue
+                tmp_path = cache_path + f'.{os.getpid()}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(profile, f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, cache_path)
+            profiles[os.path.relpath(path, dataset_dir)] = profile
+    return profiles
+
+
+def format_dataset_profile(profiles: Dict[str, dict]) -> str:
+    lines = []
+    for rel_path, profile in profiles.items():
+        for table, info in profile['tables'].items():
+            lines.append(f"File {rel_path} (table {table}): {info['row_count']} rows, {len(info['columns'])} columns")
+            for name, column in info['columns'].items():
+                value_range = f", range [{column['min']}, {column['max']}]" if column['min'] is not None else ''
+                lines.append(f"- {name}: {column['dtype']}, null rate {column['null_rate']:.2%}{value_range}, e.g. {column['samples']}")
+    return '\n'.join(lines)
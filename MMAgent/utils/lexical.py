@@ -0,0 +1,63 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset('a an and are as at be by for from in is it of on or that the this to with'.split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents, stored as an inverted index (term -> postings),
+    so scoring a query only touches the documents that contain one of its terms.
+    """
+
+    def __init__(self, documents: Dict[str, str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = list(documents)
+        self.doc_lengths = []
+        self.postings = defaultdict(list)
+        for doc_index, doc_id in enumerate(self.doc_ids):
+            tokens = tokenize(documents[doc_id])
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc_index, tf))
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        n = len(self.doc_ids)
+        self.idf = {term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5)) for term, postings in self.postings.items()}
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """BM25 score of every document matching at least one query term."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_length)
+                scores[self.doc_ids[doc_index]] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return dict(scores)
+
+
+def reciprocal_rank_fusion(rankings: List[List[float]], k: int = 60) -> List[float]:
+    """
+    Fuse several score lists over the same items by reciprocal rank. Results are scaled so that
+    an item ranked first by every list scores 1. Tied items share the better rank.
+    """
+    fused = [0.0] * len(rankings[0])
+    for scores in rankings:
+        # Sort once; every item in a run of equal scores gets the rank of the first one
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        rank = 0
+        for position, i in enumerate(order):
+            if position and scores[i] != scores[order[position - 1]]:
+                rank = position
+            fused[i] += (k + 1) / (k + rank + 1) / len(rankings)
+    return fused
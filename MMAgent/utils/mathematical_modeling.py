@@ -1,5 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 from agent.retrieve_method import MethodRetriever
 from agent.task_solving import TaskSolver
+from utils.solution_memory import reference_solutions
+from utils.convergence import ConvergenceMonitor
 from prompt.template import TASK_ANALYSIS_APPEND_PROMPT, TASK_FORMULAS_APPEND_PROMPT, TASK_MODELING_APPEND_PROMPT
 
 
@@ -56,27 +59,48 @@ No code files recorded for Task {id}.
     return task_analysis_prompt, task_formulas_prompt, task_modeling_prompt, dependent_file_prompt
 
 
-def mathematical_modeling(task_id, problem, task_descriptions, llm, config, coordinator, with_code):
+def mathematical_modeling(task_id, problem, task_descriptions, llm, config, coordinator, with_code, output_dir=None):
     print(f"[Stage 2] Task {task_id}: Mathematical Modeling")
-    ts = TaskSolver(llm)
-    mr = MethodRetriever(llm)
+    ts = TaskSolver(llm, convergence=ConvergenceMonitor.from_config(config))
+    mr = MethodRetriever(llm,
+                         max_workers=config.get('method_score_workers', 8),
+                         prune_threshold=config.get('method_prune_threshold'),
+                         beam_width=config.get('method_beam_width'),
+                         fusion=config.get('hybrid_fusion', 'weighted'),
+                         hybrid_alpha=config.get('hybrid_alpha', 0.5),
+                         embedding_backend=config.get('embedding_backend', 'fp32'),
+                         embedding_threads=config.get('embedding_threads'),
+                         embedding_dimension=config.get('embedding_dimension', 768),
+                         vector_store=config.get('vector_store', 'exact'),
+                         vector_candidates=config.get('vector_candidates'))
     task_analysis_prompt, task_formulas_prompt, task_modeling_prompt, dependent_file_prompt = get_dependency_prompt(with_code, coordinator, task_id)
     
-    # Task analysis
-    print(f"  [Task {task_id}] Step 1: Task Analysis...")
     task_description = task_descriptions[task_id - 1]
-    task_analysis = ts.analysis(task_analysis_prompt, task_description)
-    print(f"  [Task {task_id}] Step 1: Task Analysis ✓ Completed")
+    retrieval_method = config.get('method_retrieval', 'embedding')
+    # Speculative retrieval: while the task analysis is generated, retrieve candidates (and reference
+    # solutions) from the task description alone. LLM scoring is too costly to run twice, so it is excluded.
+    speculative = config.get('speculative_retrieval', True) and retrieval_method != 'llm'
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        reference_future = executor.submit(reference_solutions, config, task_description, 'mathematical_modeling_process', output_dir)
+        if speculative:
+            candidates_future = executor.submit(mr.prefetch_candidates, f'## Task Description\n{task_description}', config.get('speculative_candidates', 30), retrieval_method)
+
+        # Task analysis
+        print(f"  [Task {task_id}] Step 1: Task Analysis...")
+        task_analysis = ts.analysis(task_analysis_prompt, task_description)
+        print(f"  [Task {task_id}] Step 1: Task Analysis ✓ Completed")
     
     # Hierarchical Modeling Knowledge Retrieval
     print(f"  [Task {task_id}] Step 2: Method Retrieval (retrieving top {config['top_method_num']} methods)...")
     description_and_analysis = f'## Task Description\n{task_description}\n\n## Task Analysis\n{task_analysis}'
-    top_modeling_methods = mr.retrieve_meethods(description_and_analysis, top_k=config['top_method_num'])
+    candidates = candidates_future.result() if speculative else None
+    top_modeling_methods = mr.retrieve_meethods(description_and_analysis, top_k=config['top_method_num'], method=retrieval_method, candidates=candidates)
     print(f"  [Task {task_id}] Step 2: Method Retrieval ✓ Completed")
     
     # Task Modeling
     print(f"  [Task {task_id}] Step 3: Mathematical Modeling (formulas + modeling process)...")
-    task_modeling_formulas, task_modeling_method = ts.modeling(task_formulas_prompt, task_modeling_prompt, problem['data_description'], task_description, task_analysis, top_modeling_methods, round=config['task_formulas_round'])
+    reference_modeling = reference_future.result()
+    task_modeling_formulas, task_modeling_method = ts.modeling(task_formulas_prompt, task_modeling_prompt, problem['data_description'], task_description, task_analysis, top_modeling_methods, round=config['task_formulas_round'], reference_solutions=reference_modeling)
     print(f"  [Task {task_id}] Step 3: Mathematical Modeling ✓ Completed")
     print(f"[Stage 2] Task {task_id}: Mathematical Modeling ✓ All steps completed\n")
     
@@ -0,0 +1,60 @@
+import re
+from typing import List, Tuple
+
+
+EDIT_BLOCK_PATTERN = re.compile(r'<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE', re.DOTALL)
+
+
+class PatchError(Exception):
+    def __init__(self, message):
+        self.message = message
+    def __str__(self):
+        return self.message
+
+
+def parse_edit_blocks(response: str) -> List[Tuple[str, str]]:
+    """
+    Parse SEARCH/REPLACE edit blocks from an LLM response.
+
+    Returns:
+        list: (search, replace) pairs in the order they appear.
+    """
+    return [(search, replace) for search, replace in EDIT_BLOCK_PATTERN.findall(response)]
+
+
+def _replace_ignoring_indentation(code: str, search: str, replace: str) -> str:
+    """Match the search block line by line ignoring surrounding whitespace, keeping the original indentation."""
+    code_lines = code.split('\n')
+    search_lines = [line.strip() for line in search.strip('\n').split('\n')]
+    n = len(search_lines)
+    matches = [i for i in range(len(code_lines) - n + 1) if [line.strip() for line in code_lines[i:i + n]] == search_lines]
+    if len(matches) != 1:
+        raise PatchError(f"Search block matched {len(matches)} times:\n{search}")
+    start = matches[0]
+    original_indent = code_lines[start][:len(code_lines[start]) - len(code_lines[start].lstrip())]
+    replace_lines = replace.strip('\n').split('\n') if replace.strip() else []
+    replace_indent = replace_lines[0][:len(replace_lines[0]) - len(replace_lines[0].lstrip())] if replace_lines else ''
+    reindented = [original_indent + line[len(replace_indent):] if line.startswith(replace_indent) else line for line in replace_lines]
+    return '\n'.join(code_lines[:start] + reindented + code_lines[start + n:])
+
+
+def apply_edit_blocks(code: str, edits: List[Tuple[str, str]]) -> str:
+    """
+    Apply SEARCH/REPLACE edits to the code. Every search block must match exactly once.
+
+    Raises:
+        PatchError: If there are no edits or a search block cannot be located unambiguously.
+    """
+    if not edits:
+        raise PatchError("No SEARCH/REPLACE blocks found in the response.")
+    for search, replace in edits:
+        if not search.strip():
+            raise PatchError("Empty SEARCH block.")
+        count = code.count(search)
+        if count == 1:
+            code = code.replace(search, replace)
+        elif count == 0:
+            code = _replace_ignoring_indentation(code, search, replace)
+        else:
+            raise PatchError(f"Search block matched {count} times:\n{search}")
+    return code
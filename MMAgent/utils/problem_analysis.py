@@ -4,11 +4,14 @@ from agent.data_description import DataDescription
 from agent.problem_analysis import ProblemUnderstanding
 from agent.coordinator import Coordinator
 from agent.problem_decompse import ProblemDecompose
+from utils.workspace import link_tree
+from utils.convergence import ConvergenceMonitor
+from utils.columnar import convert_dataset, install_data_loader
+from utils.file_profile import profile_dataset, format_dataset_profile
 from prompt.template import PROBLEM_PROMPT
-import shutil
 
 
-def get_problem(problem_path, llm):
+def get_problem(problem_path, llm, dataset_path=None):
     problem = read_json_file(problem_path)
     data_description = problem.get('dataset_description', {})
     ds = DataDescription(llm)
@@ -23,6 +26,15 @@ def get_problem(problem_path, llm):
     else:
         data_summary = ''
 
+    data_profile = ''
+    if dataset_path and os.path.isdir(dataset_path):
+        print("  [Problem Loading] Profiling dataset files...")
+        data_profile = format_dataset_profile(profile_dataset(dataset_path))
+        if data_profile:
+            data_summary = f'{data_summary}\n\nDataset Profile:\n{data_profile}'.strip()
+        print("  [Problem Loading] ✓ Dataset profiled")
+    problem['data_profile'] = data_profile
+
     problem['data_summary'] = data_summary
     problem['data_description'] = data_description
 
@@ -39,7 +51,7 @@ def get_problem(problem_path, llm):
 def problem_analysis(llm, problem_path, config, dataset_path, output_dir):
     # Get problem
     print("[Stage 1] Loading problem...")
-    problem_str, problem = get_problem(problem_path, llm)
+    problem_str, problem = get_problem(problem_path, llm, dataset_path)
     problem_type = os.path.splitext(os.path.basename(problem_path))[0].split('_')[-1]
     
     # Initialize solution dictionary
@@ -49,7 +61,7 @@ def problem_analysis(llm, problem_path, config, dataset_path, output_dir):
 
     # Problem Understanding
     print("[Stage 1] Step 1: Problem Understanding")
-    pu = ProblemUnderstanding(llm)
+    pu = ProblemUnderstanding(llm, convergence=ConvergenceMonitor.from_config(config))
     problem_analysis = pu.analysis(problem_str, round=config['problem_analysis_round'])
     solution['problem_analysis'] = problem_analysis
 
@@ -75,8 +87,12 @@ def problem_analysis(llm, problem_path, config, dataset_path, output_dir):
     order = [int(i) for i in order]
     print(f"  [Dependency Analysis] Execution order: {order}")
     if with_code:
-        print("  [Dependency Analysis] Copying dataset files...")
-        shutil.copytree(dataset_path, os.path.join(output_dir,'code'), dirs_exist_ok=True)
+        print("  [Dependency Analysis] Linking dataset files...")
+        link_tree(dataset_path, os.path.join(output_dir,'code'))
+        install_data_loader(os.path.join(output_dir,'code'))
+        if config.get('columnar_dataset', True):
+            print("  [Dependency Analysis] Preparing columnar dataset copies...")
+            convert_dataset(dataset_path, os.path.join(output_dir,'code'))
     print('[Stage 1] Step 3: Task Dependency Analysis ✓ Completed')
     print('[Stage 1] ✓ All steps completed\n')
 
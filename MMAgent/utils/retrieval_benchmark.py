@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+# Run as a script from the repository root: resolve imports against MMAgent/ instead of this directory, which holds utils.py
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from agent.retrieve_method import MethodRetriever
+from utils.embedding_benchmark import load_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the recall of beam-search and vector-store method retrieval against exhaustive scoring.')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--beam_widths', nargs='+', type=int, default=None, help='Defaults to method_beam_width from the config')
+    parser.add_argument('--vector_candidates', nargs='+', type=int, default=None,
+                        help='Candidate counts for embedding retrieval from the vector store; defaults to vector_candidates from the config')
+    parser.add_argument('--method', choices=['embedding', 'hybrid'], default=None, help='Defaults to method_retrieval from the config')
+    parser.add_argument('--top_k', type=int, default=None, help='Defaults to top_method_num from the config')
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    beam_widths = args.beam_widths or ([config['method_beam_width']] if config.get('method_beam_width') else [])
+    vector_candidates = args.vector_candidates or ([config['vector_candidates']] if config.get('vector_candidates') else [])
+    if not beam_widths and not vector_candidates:
+        sys.exit('method_beam_width and vector_candidates are null in the config; pass --beam_widths or --vector_candidates.')
+    method = args.method or config.get('method_retrieval', 'embedding')
+    if method == 'llm':
+        sys.exit('Beam recall is measured with the embedding or hybrid scorer; pass --method.')
+    top_k = args.top_k or config.get('top_method_num', 6)
+
+    queries = load_queries(limit=args.queries)
+    if not queries:
+        sys.exit('No saved solutions found under MMAgent/output to build queries from.')
+    mr = MethodRetriever(None,
+                         prune_threshold=config.get('method_prune_threshold'),
+                         fusion=config.get('hybrid_fusion', 'weighted'),
+                         hybrid_alpha=config.get('hybrid_alpha', 0.5),
+                         embedding_backend=config.get('embedding_backend', 'fp32'),
+                         embedding_threads=config.get('embedding_threads'),
+                         embedding_dimension=config.get('embedding_dimension', 768),
+                         vector_store=config.get('vector_store', 'exact'))
+    print(f"{len(queries)} queries, method={method}, top_k={top_k}")
+    # Build the method vector store and load the model outside the timed runs
+    mr.score_methods(queries[0], method)
+
+    start = time.perf_counter()
+    for query in queries:
+        mr.score_methods(query, method)
+    exhaustive_latency = (time.perf_counter() - start) / len(queries)
+    print(f"exhaustive: {exhaustive_latency * 1000:.1f}ms/query")
+    for beam_width in beam_widths:
+        start = time.perf_counter()
+        for query in queries:
+            mr.score_methods(query, method, beam_width)
+        latency = (time.perf_counter() - start) / len(queries)
+        recall = sum(mr.beam_recall(query, beam_width, top_k, method) for query in queries) / len(queries)
+        print(f"beam {beam_width}: {latency * 1000:.1f}ms/query, top-{top_k} recall {recall:.2%}")
+    if vector_candidates and not mr.vector_store:
+        sys.exit('vector_candidates needs a vector_store in the config.')
+    for candidate_num in vector_candidates:
+        start = time.perf_counter()
+        for query in queries:
+            mr.rerank(query, mr.search_methods(query, candidate_num), 'embedding')
+        latency = (time.perf_counter() - start) / len(queries)
+        # Candidates come from dense similarity, so recall is measured against exhaustive embedding scoring
+        recall = sum(mr.candidate_recall(query, candidate_num, top_k) for query in queries) / len(queries)
+        print(f"vector store, {candidate_num} candidates: {latency * 1000:.1f}ms/query, top-{top_k} recall vs exhaustive embedding {recall:.2%}")
+
+
+if __name__ == "__main__":
+    main()
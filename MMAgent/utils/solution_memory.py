@@ -0,0 +1,113 @@
+import glob
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import List
+
+from utils.embedding import get_embedding_scorer
+
+
+class SolutionMemory:
+    """
+    Nearest-neighbour index over tasks solved in earlier runs.
+
+    Every task of every saved solution (output/<method>/<task>_<ts>/json/*.json) is embedded by its
+    task description and kept in a persisted vector store, with the source file and task index as
+    metadata. The modeling text and code are read back from the solution file only when retrieved.
+    """
+
+    def __init__(self, embedding_scorer, output_root: str = 'MMAgent/output', cache_dir: str = 'MMAgent/cache/solution_memory'):
+        from utils.vector_store import create_vector_store, load_vector_store
+
+        self.embedding_scorer = embedding_scorer
+        self.output_root = output_root
+        model_id = embedding_scorer.query_cache.model_id
+        self.path = os.path.join(cache_dir, f"{hashlib.sha256(model_id.encode()).hexdigest()[:16]}.npz")
+        self.store = load_vector_store(self.path) if os.path.exists(self.path) else create_vector_store('exact', embedding_scorer.dimension)
+        self.refresh()
+
+    def _scan(self) -> dict:
+        records = {}
+        for path in sorted(glob.glob(os.path.join(self.output_root, '*', '*', 'json', '*.json'))):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    tasks = json.load(f).get('tasks', [])
+            except (OSError, ValueError):
+                continue
+            for index, task in enumerate(tasks):
+                description = task.get('task_description')
+                if not description or not task.get('mathematical_modeling_process'):
+                    continue
+                # Ids change with the description, so an edited solution file is re-embedded
+                record_id = f"{path}#{index}:{hashlib.sha256(description.encode()).hexdigest()[:12]}"
+                records[record_id] = {'path': path, 'index': index, 'passed': bool(task.get('is_pass')), 'description': description}
+        return records
+
+    def refresh(self):
+        """Sync the index with the solution files on disk: embed new tasks and drop deleted ones."""
+        records = self._scan()
+        stale = [record_id for record_id in self.store.live_ids() if record_id not in records]
+        missing = [record_id for record_id in records if record_id not in self.store]
+        self.store.remove(stale)
+        for start in range(0, len(missing), 16):
+            batch = missing[start:start + 16]
+            vectors = self.embedding_scorer.embed([records[record_id].pop('description') for record_id in batch]).cpu().numpy()
+            self.store.add(batch, vectors, [records[record_id] for record_id in batch])
+        if stale or missing:
+            self.store.save(self.path)
+            print(f"  [Solution Memory] Indexed {len(missing)} new tasks ({len(self.store)} total)")
+
+    def retrieve(self, task_description: str, k: int = 2, passed_only: bool = False, min_score: float = 0.5, exclude_dir: str = None) -> List[dict]:
+        """
+        Return up to k earlier tasks most similar to the description, best first.
+
+        Returns:
+            list: Dicts with score, task_description, mathematical_modeling_process, task_code and is_pass.
+        """
+        if not len(self.store):
+            return []
+        query = self.embedding_scorer.embed_query(task_description).cpu().numpy()
+        filters = {'passed': True} if passed_only else {}
+        results = []
+        # Over-fetch so that tasks from the excluded (current) run do not crowd out the others
+        for record_id, score in self.store.search(query, k + 8, **filters):
+            metadata = self.store.metadata[record_id]
+            if score < min_score or (exclude_dir and os.path.abspath(metadata['path']).startswith(os.path.abspath(exclude_dir))):
+                continue
+            with open(metadata['path'], 'r', encoding='utf-8') as f:
+                task = json.load(f)['tasks'][metadata['index']]
+            results.append(dict(score=score, task_description=task['task_description'], mathematical_modeling_process=task.get('mathematical_modeling_process', ''),
+                                task_code=task.get('task_code', ''), is_pass=task.get('is_pass')))
+            if len(results) == k:
+                break
+        return results
+
+
+def format_reference_solutions(records: List[dict], field: str, max_chars: int = 3000) -> str:
+    """Render retrieved tasks as few-shot examples showing the given field (mathematical_modeling_process or task_code)."""
+    examples = []
+    for i, record in enumerate(records, start=1):
+        content = record[field][:max_chars]
+        if field == 'task_code':
+            content = f"```python\n{content}\n```"
+        examples.append(f"## Example {i} (similarity {record['score']:.2f})\n### Task Description:\n{record['task_description'][:1000]}\n### Solution:\n{content}")
+    return '\n\n'.join(examples) if examples else 'None'
+
+
+@lru_cache(maxsize=None)
+def get_solution_memory(embedding_backend: str = 'fp32', embedding_threads: int = None, embedding_dimension: int = 768) -> SolutionMemory:
+    """Return a process-wide SolutionMemory, indexed once per run."""
+    return SolutionMemory(get_embedding_scorer(backend=embedding_backend, num_threads=embedding_threads, dimension=embedding_dimension))
+
+
+def reference_solutions(config: dict, task_description: str, field: str, output_dir: str) -> str:
+    """Few-shot context from earlier runs for the given field, or 'None' when solution_memory is disabled."""
+    if not config.get('solution_memory', True):
+        return 'None'
+    memory = get_solution_memory(config.get('embedding_backend', 'fp32'), config.get('embedding_threads'), config.get('embedding_dimension', 768))
+    records = memory.retrieve(task_description, k=config.get('solution_memory_k', 2), passed_only=field == 'task_code',
+                              min_score=config.get('solution_memory_min_score', 0.5), exclude_dir=output_dir)
+    if records:
+        print(f"  [Solution Memory] Using {len(records)} similar solved tasks as references (best similarity {records[0]['score']:.2f})")
+    return format_reference_solutions(records, field)
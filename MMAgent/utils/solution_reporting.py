@@ -6,15 +6,18 @@ language models to create content for each section.
 """
 
 import json
+import hashlib
+import shutil
 import subprocess
 import os
 import re
+import threading
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Import statements would be here in a real application
 from prompt.template import PAPER_CHAPTER_PROMPT, PAPER_CHAPTER_WITH_PRECEDING_PROMPT, PAPER_INFO_PROMPT, PAPER_NOTATION_PROMPT
-from llm.llm import LLM
 from utils.utils import parse_llm_output_to_json
 
 # --------------------------------
@@ -63,15 +66,27 @@ def escape_underscores_in_quotes(text):
 class ContentGenerator:
     """Interface for generating content using language models"""
     
-    def __init__(self, llm):
+    def __init__(self, llm, cache_dir: str = 'MMAgent/cache/chapters'):
         self.llm = llm
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
     
     def generate_chapter_content(self, prompt: str) -> Dict[str, str]:
-        """Generate chapter content using the language model"""
+        """Generate chapter content using the language model, reusing the cached fragment for an identical prompt"""
+        key = hashlib.sha256(f"{getattr(self.llm, 'model_name', '')}\n{prompt}".encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{key}.tex")
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                return f.read()
         response = self.llm.generate(prompt)
         response = escape_underscores_in_quotes(response)
         response = response.replace("```latex", "").replace("```", "")
         # return self._parse_latex_response(response)
+        if not response.startswith('An error occurred'):
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(response)
+            os.replace(tmp_path, cache_path)
         return response
     
     def _parse_latex_response(self, latex_string: str) -> Dict[str, str]:
@@ -369,8 +384,12 @@ class PromptCreator:
 class LatexDocumentAssembler:
     """Assembles the final LaTeX document from generated chapters"""
     
-    def create_document(self, chapters: List[Chapter], metadata: Dict[str, Any]) -> str:
-        """Create a complete LaTeX document"""
+    def create_document(self, chapters: List[Chapter], metadata: Dict[str, Any], fragment_dir: Optional[str] = None, base_dir: Optional[str] = None) -> str:
+        """
+        Create a complete LaTeX document. With fragment_dir, chapter contents are written there and included with \\input.
+        With base_dir (the directory LaTeX runs in), fragment and figure paths are written relative to it, so the
+        output directory can be moved or archived and still build.
+        """
         # Reorder chapters (move Notation chapter after Explanation of Assumptions)
         ordered_chapters = self._reorder_chapters(chapters)
         
@@ -382,7 +401,7 @@ class LatexDocumentAssembler:
             "\\renewcommand\\cfttoctitlefont{\\hfil\\Large\\bfseries}",
             "\\tableofcontents",
             "\\newpage",
-            self._create_body(ordered_chapters, metadata),
+            self._create_body(ordered_chapters, metadata, fragment_dir, base_dir),
             "\\end{document}"
         ]
         
@@ -402,11 +421,19 @@ class LatexDocumentAssembler:
                     
         return reordered
     
-    def _add_figure(self, figures: List[str]) -> str:
+    @staticmethod
+    def _latex_path(path: str, base_dir: Optional[str]) -> str:
+        """path as LaTeX should see it: relative to base_dir when given, always with forward slashes"""
+        if base_dir:
+            path = os.path.relpath(path, base_dir)
+        return path.replace(os.sep, '/')
+
+    def _add_figure(self, figures: List[str], base_dir: Optional[str] = None) -> str:
         """Add a figure to the content"""
         figure_str = []
         for i, figure_path in enumerate(figures):
             name = figure_path.split('/')[-1].split('.')[0].replace('_', '\\_')
+            figure_path = self._latex_path(figure_path, base_dir)
             figure_str.append(f"""
 \\begin{{figure}}[H]
 \\centering
@@ -484,7 +511,16 @@ def main1():
 \\end{{keywords}}
 \\end{{abstract}}"""
     
-    def _create_body(self, chapters: List[Chapter], metadata: Dict[str, Any]) -> str:
+    def _write_fragment(self, content: str, fragment_dir: str, base_dir: Optional[str] = None) -> str:
+        """Write a chapter fragment named by its content hash, so unchanged chapters keep their file untouched"""
+        os.makedirs(fragment_dir, exist_ok=True)
+        fragment_path = os.path.join(fragment_dir, f"{hashlib.sha256(content.encode()).hexdigest()[:16]}.tex")
+        if not os.path.exists(fragment_path):
+            with open(fragment_path, 'w') as f:
+                f.write(content)
+        return f"\\input{{{self._latex_path(fragment_path, base_dir)}}}"
+
+    def _create_body(self, chapters: List[Chapter], metadata: Dict[str, Any], fragment_dir: Optional[str] = None, base_dir: Optional[str] = None) -> str:
         """Create the main body of the document from chapters"""
         body_parts = []
         current_path = []
@@ -492,7 +528,7 @@ def main1():
         for chapter in chapters:
             # Add section headings
             if chapter.path == ["Model Conclusion", "Model Advantages"] and metadata.get('figures', []):
-                body_parts += self._add_figure(metadata['figures'])
+                body_parts += self._add_figure(metadata['figures'], base_dir)
 
             for i, section in enumerate(chapter.path):
                 # If this path level is new or different
@@ -517,7 +553,10 @@ def main1():
             
             # Add chapter content if generated
             if chapter.is_generated and chapter.content:
-                body_parts.append(chapter.content)
+                if fragment_dir:
+                    body_parts.append(self._write_fragment(chapter.content, fragment_dir, base_dir))
+                else:
+                    body_parts.append(chapter.content)
 
         body_parts.append("\\section{References}")
         body_parts += self._add_code(metadata['codes'])
@@ -539,28 +578,71 @@ class FileManager:
         print(f"Document saved to {filepath}")
     
     @staticmethod
-    def generate_pdf(latex_path: str) -> None:
-        """Generate a PDF from a LaTeX file"""
-        print(f"Generating PDF from {latex_path}...")
-        
-        # Run pdflatex twice to ensure references and TOC are correct
+    def _digest(path: str) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @staticmethod
+    def _build_hash(latex_path: str) -> str:
+        """
+        Digest of everything the PDF depends on: the .tex (chapter fragments are named by content hash, so it
+        covers them) and every figure included by it or its fragments, so a regenerated chart triggers a rebuild.
+        """
         latex_dir = os.path.dirname(latex_path)
-        subprocess.run(["pdflatex", f"-output-directory={latex_dir}", "-interaction=nonstopmode", latex_path])
-        subprocess.run(["pdflatex", f"-output-directory={latex_dir}", "-interaction=nonstopmode", latex_path])
-        
-        # Clean up auxiliary files
-        FileManager._clean_temp_files(latex_path)
-        
+        with open(latex_path, 'r') as f:
+            latex = f.read()
+        h = hashlib.sha256(latex.encode())
+        sources = [latex]
+        for fragment in re.findall(r'\\input\{([^}]*)\}', latex):
+            if os.path.exists(os.path.join(latex_dir, fragment)):
+                with open(os.path.join(latex_dir, fragment), 'r') as f:
+                    sources.append(f.read())
+        figures = set(re.findall(r'\\includegraphics(?:\[[^\]]*\])?\{([^}]*)\}', '\n'.join(sources)))
+        for figure in sorted(figures):
+            h.update(f"\n{figure}:{FileManager._digest(os.path.join(latex_dir, figure))}".encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def generate_pdf(latex_path: str, timeout: int = 300) -> None:
+        """
+        Generate a PDF from a LaTeX file, incrementally.
+        The build hash covers the .tex, whose fragments are named by content hash, and the included figures,
+        so an unchanged document is not rebuilt. LaTeX runs inside the .tex directory, against which all
+        paths in the document are relative. latexmk is used when available; otherwise pdflatex runs a second
+        pass only if the .aux or .toc changed. Every compiler call is bounded by the timeout.
+        """
         pdf_path = latex_path.replace('.tex', '.pdf')
+        stamp_path = latex_path.replace('.tex', '.buildhash')
+        build_hash = FileManager._build_hash(latex_path)
+        if os.path.exists(pdf_path) and os.path.exists(stamp_path):
+            with open(stamp_path, 'r') as f:
+                if f.read() == build_hash:
+                    print(f"PDF is up to date at {pdf_path}")
+                    return
+        print(f"Generating PDF from {latex_path}...")
+        
+        latex_dir = os.path.dirname(latex_path) or '.'
+        latex_file = os.path.basename(latex_path)
+        try:
+            if shutil.which("latexmk"):
+                subprocess.run(["latexmk", "-pdf", "-interaction=nonstopmode", latex_file], cwd=latex_dir, timeout=timeout)
+            else:
+                state_files = [latex_path.replace('.tex', f'.{ext}') for ext in ["aux", "toc"]]
+                before = [FileManager._digest(path) for path in state_files]
+                subprocess.run(["pdflatex", "-interaction=nonstopmode", latex_file], cwd=latex_dir, timeout=timeout)
+                # A second pass is only needed when references or the table of contents changed
+                if [FileManager._digest(path) for path in state_files] != before:
+                    subprocess.run(["pdflatex", "-interaction=nonstopmode", latex_file], cwd=latex_dir, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"PDF generation timed out after {timeout}s, check the chapter fragments of {latex_path}")
+            return
+        
+        if os.path.exists(pdf_path):
+            with open(stamp_path, 'w') as f:
+                f.write(build_hash)
         print(f"PDF generated at {pdf_path}")
-    
-    @staticmethod
-    def _clean_temp_files(latex_path: str) -> None:
-        """Clean up temporary files created during PDF generation"""
-        for ext in ["aux", "log", "toc", "out"]:
-            aux_file = latex_path.replace('.tex', f'.{ext}')
-            if os.path.exists(aux_file):
-                os.remove(aux_file)
 
 # --------------------------------
 # Main Paper Generator
@@ -569,7 +651,9 @@ class FileManager:
 class PaperGenerator:
     """Main class that orchestrates the paper generation process"""
     
-    def __init__(self, llm):
+    def __init__(self, llm, max_workers: int = 8, latex_timeout: int = 300):
+        self.max_workers = max_workers
+        self.latex_timeout = latex_timeout
         self.content_generator = ContentGenerator(llm)
         self.outline_generator = OutlineGenerator()
         self.context_extractor = ContextExtractor()
@@ -592,24 +676,60 @@ class PaperGenerator:
         # Generate chapter relevance map if not provided
         chapter_relevance_map = self.outline_generator.generate_chapter_relevance_map(task_count)
         
-        # 2. Generate content for each chapter that needs it
-        completed_chapters = []
-        for chapter in chapters:
-            if chapter.needs_content:
-                self._generate_chapter_content(chapter, json_data, completed_chapters, chapter_relevance_map)
-                completed_chapters.append(chapter)
+        # 2. Generate content for each chapter that needs it, concurrently once its relevant chapters are done
+        self._generate_chapters_concurrently(chapters, json_data, chapter_relevance_map)
         
         # 3. Complete metadata if needed
         complete_metadata = self._complete_metadata(chapters, metadata)
         
         # 4. Assemble the final document
-        document = self.document_assembler.create_document(chapters, complete_metadata)
+        document = self.document_assembler.create_document(chapters, complete_metadata, fragment_dir=f"{output_dir}/chapters", base_dir=output_dir)
         
         # 5. Save and convert to PDF
         latex_path = f"{output_dir}/{filename}.tex"
         self.file_manager.save_to_file(document, latex_path)
-        self.file_manager.generate_pdf(latex_path)
+        self.file_manager.generate_pdf(latex_path, timeout=self.latex_timeout)
         
+    def _build_chapter_dependencies(self,
+                              chapters: List[Chapter],
+                              chapter_relevance_map: Dict[str, List[str]]) -> Dict[str, List[Chapter]]:
+        """
+        Map each content chapter to the earlier content chapters it needs as context.
+        Chapters missing from the relevance map depend on every earlier chapter, as in sequential generation.
+        """
+        dependencies = {}
+        for i, chapter in enumerate(chapters):
+            earlier = chapters[:i]
+            if chapter.path_string in chapter_relevance_map:
+                relevant_paths = chapter_relevance_map[chapter.path_string]
+                dependencies[chapter.path_string] = [ch for ch in earlier if ch.path_string in relevant_paths]
+            else:
+                dependencies[chapter.path_string] = earlier
+        return dependencies
+
+    def _generate_chapters_concurrently(self,
+                                  chapters: List[Chapter],
+                                  json_data: Dict[str, Any],
+                                  chapter_relevance_map: Dict[str, List[str]]) -> None:
+        """Generate chapters in dependency waves: every chapter starts as soon as its relevant chapters are finished"""
+        content_chapters = [ch for ch in chapters if ch.needs_content]
+        dependencies = self._build_chapter_dependencies(content_chapters, chapter_relevance_map)
+        finished = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(finished) < len(content_chapters):
+                for chapter in content_chapters:
+                    path = chapter.path_string
+                    if path in finished or path in running.values():
+                        continue
+                    if all(dep.path_string in finished for dep in dependencies[path]):
+                        future = executor.submit(self._generate_chapter_content, chapter, json_data, dependencies[path], chapter_relevance_map)
+                        running[future] = path
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    finished.add(running.pop(future))
+
     def _generate_chapter_content(self, 
                             chapter: Chapter, 
                             json_data: Dict[str, Any],
@@ -722,7 +842,7 @@ def generate_paper(llm, output_dir, name):
     json_file_path = f"{output_dir}/json/{name}.json"
     code_dir = f'{output_dir}/code'
     metadata['figures'] = [os.path.join(code_dir, f) for f in os.listdir(code_dir) if f.lower().split('.')[-1] in ['png', 'jpg', 'jpeg']]
-    metadata['codes'] = sorted([os.path.join(code_dir, f) for f in os.listdir(code_dir) if f.lower().split('.')[-1] in ['py']])
+    metadata['codes'] = sorted([os.path.join(code_dir, f) for f in os.listdir(code_dir) if f.lower().split('.')[-1] in ['py'] and f.startswith('main')])
     with open(json_file_path, 'r') as f:
         json_data = json.loads(f.read())
     json_data['tasks'] = json_data['tasks'][:]
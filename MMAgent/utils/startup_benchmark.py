@@ -0,0 +1,64 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+HEAVY_MODULES = ('torch', 'transformers', 'tiktoken', 'pypandoc', 'pandas', 'numpy')
+
+# Imports every pipeline module the way main.run does, then reports which heavy dependencies were loaded.
+PROBE = """
+import json, sys, time
+sys.path.insert(0, 'MMAgent')
+start = time.perf_counter()
+import main
+main_time = time.perf_counter() - start
+for module in %r:
+    __import__(module)
+loaded = [m for m in %r if m in sys.modules]
+print(json.dumps({'main_import': main_time, 'heavy_loaded': loaded}))
+"""
+
+STAGE_MODULES = ('utils.problem_analysis', 'utils.mathematical_modeling', 'utils.computational_solving', 'utils.solution_reporting')
+
+
+def time_help(python: str = sys.executable, repeat: int = 3) -> float:
+    """Best wall time of `python MMAgent/main.py --help` over several runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([python, 'MMAgent/main.py', '--help'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def probe_imports(python: str = sys.executable) -> dict:
+    result = subprocess.run([python, '-c', PROBE % (STAGE_MODULES, HEAVY_MODULES)], capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'probe failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that MMAgent CLI startup stays within a time budget.')
+    parser.add_argument('--budget', type=float, default=1.0, help='Maximum wall time in seconds for main.py --help')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    help_time = time_help(repeat=args.repeat)
+    probe = probe_imports()
+    print(f"main.py --help: {help_time:.3f}s (budget {args.budget:.3f}s)")
+    if 'error' in probe:
+        print(f"Stage import probe skipped: {probe['error']}")
+    else:
+        print(f"import main: {probe['main_import']:.3f}s")
+        print(f"Heavy modules loaded by importing the stages: {probe['heavy_loaded'] or 'none'}")
+
+    failed = help_time > args.budget or bool(probe.get('heavy_loaded'))
+    print('✗ Startup check failed' if failed else '✓ Startup check passed')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import json
 from typing import Dict
 import os
+import tempfile
+import threading
 import yaml
 from datetime import datetime
 
@@ -158,10 +160,71 @@ def json_to_markdown_general(json_data):
     return markdown
 
 
+def write_text_file_atomic(file_path: str, content: str):
+    """Write to a temporary file in the same directory and rename it, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
+
 def save_solution(solution, name, path):
-    write_json_file(f'{path}/json/{name}.json', solution)
+    """Materialize the full solution JSON and markdown."""
+    write_text_file_atomic(f'{path}/json/{name}.json', json.dumps(solution, indent=4, ensure_ascii=False))
     markdown_str = json_to_markdown(solution)
-    write_text_file(f'{path}/markdown/{name}.md', markdown_str)
+    write_text_file_atomic(f'{path}/markdown/{name}.md', markdown_str)
+
+
+_record_lock = threading.Lock()
+
+
+def append_solution_record(record: dict, name: str, path: str):
+    """
+    Append one record to the solution log ({name}.tasks.jsonl). A record is either a new task
+    ({"index": i, "task": {...}}) or an update of an existing one ({"index": i, "update": {...}}).
+    """
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _record_lock, open(f'{path}/json/{name}.tasks.jsonl', 'a', encoding='utf-8') as file:
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def save_solution_manifest(solution: dict, name: str, path: str):
+    """Atomically write the problem-level fields of the solution ({name}.manifest.json)."""
+    manifest = {key: value for key, value in solution.items() if key != 'tasks'}
+    manifest['task_count'] = len(solution.get('tasks', []))
+    write_text_file_atomic(f'{path}/json/{name}.manifest.json', json.dumps(manifest, ensure_ascii=False))
+
+
+def load_solution(name: str, path: str) -> dict:
+    """Rebuild the solution from the manifest and the record log. A torn last line from a crash is ignored."""
+    manifest = read_json_file(f'{path}/json/{name}.manifest.json')
+    manifest.pop('task_count', None)
+    solution = {'tasks': [], **manifest}
+    records_path = f'{path}/json/{name}.tasks.jsonl'
+    if os.path.exists(records_path):
+        with open(records_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                index = record['index']
+                if 'task' in record:
+                    solution['tasks'].extend({} for _ in range(index + 1 - len(solution['tasks'])))
+                    solution['tasks'][index] = record['task']
+                elif index < len(solution['tasks']):
+                    solution['tasks'][index].update(record['update'])
+    return solution
+
+
+def materialize_solution(name: str, path: str) -> dict:
+    solution = load_solution(name, path)
+    save_solution(solution, name, path)
+    return solution
 
 
 def mkdir(path):
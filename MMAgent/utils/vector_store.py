@@ -0,0 +1,220 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorStore:
+    """
+    Exact inner-product search over L2-normalized vectors held in one NumPy matrix.
+
+    Every vector has a string id and a metadata dict (e.g. {'domain': ...}). Removed rows are
+    tombstoned and compacted once they outnumber the live ones, so add/remove/update stay cheap.
+    """
+
+    kind = 'exact'
+    row_arrays = ('vectors', 'live')
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self.ids = []
+        self.rows = {}
+        self.metadata = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, id_):
+        return id_ in self.rows
+
+    def add(self, ids: List[str], vectors, metadata: Optional[List[dict]] = None):
+        """Insert vectors; ids that already exist are updated in place."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension))
+        updated, new_ids, new_vectors = [], [], []
+        for i, id_ in enumerate(ids):
+            if metadata is not None:
+                self.metadata[id_] = metadata[i]
+            if id_ in self.rows:
+                self.vectors[self.rows[id_]] = vectors[i]
+                updated.append(self.rows[id_])
+            else:
+                new_ids.append(id_)
+                new_vectors.append(vectors[i])
+        if updated:
+            self._on_rows_changed(np.array(updated))
+        if new_ids:
+            start = len(self.ids)
+            self._grow(len(new_ids))
+            self.vectors[start:] = np.stack(new_vectors)
+            self.live[start:] = True
+            for offset, id_ in enumerate(new_ids):
+                self.ids.append(id_)
+                self.rows[id_] = start + offset
+            self._on_rows_changed(np.arange(start, len(self.ids)))
+
+    update = add
+
+    def remove(self, ids: List[str]):
+        for id_ in ids:
+            row = self.rows.pop(id_, None)
+            if row is not None:
+                self.live[row] = False
+                self.metadata.pop(id_, None)
+        if len(self.ids) - len(self.rows) > len(self.rows):
+            self._compact()
+
+    def get(self, ids: List[str]) -> np.ndarray:
+        return self.vectors[[self.rows[id_] for id_ in ids]]
+
+    def live_ids(self) -> List[str]:
+        return [self.ids[row] for row in np.flatnonzero(self.live)]
+
+    def search(self, query, k: int = 10, **filters) -> List[Tuple[str, float]]:
+        """
+        Return the k ids most similar to the query as (id, cosine similarity), best first,
+        optionally restricted to vectors whose metadata matches every filter (e.g. domain=...).
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(self.dimension))
+        rows = self._candidate_rows(query)
+        if filters and len(rows):
+            rows = rows[[all(self.metadata.get(self.ids[row], {}).get(key) == value for key, value in filters.items()) for row in rows]]
+        if not len(rows):
+            return []
+        scores = self.vectors[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(self.live)
+
+    def _on_rows_changed(self, rows: np.ndarray):
+        pass
+
+    def _grow(self, n: int):
+        self.vectors = np.concatenate([self.vectors, np.zeros((n, self.dimension), dtype=np.float32)])
+        self.live = np.concatenate([self.live, np.zeros(n, dtype=bool)])
+
+    def _compact(self):
+        keep = np.flatnonzero(self.live)
+        for name in self.row_arrays:
+            setattr(self, name, getattr(self, name)[keep])
+        self.ids = [self.ids[row] for row in keep]
+        self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+
+    def _state(self) -> dict:
+        return {}
+
+    def _extra_arrays(self) -> dict:
+        return {}
+
+    def _load_state(self, state: dict, arrays):
+        pass
+
+    def save(self, path: str):
+        """Write the store to a single .npz file atomically."""
+        self._compact()
+        header = {'kind': self.kind, 'dimension': self.dimension, 'ids': self.ids, 'metadata': self.metadata, 'state': self._state()}
+        arrays = {name: getattr(self, name) for name in self.row_arrays}
+        arrays.update(self._extra_arrays())
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, header=np.array(json.dumps(header, ensure_ascii=False)), **arrays)
+        os.replace(tmp_path, path)
+
+
+class IVFVectorStore(VectorStore):
+    """
+    Approximate search with an inverted file index: vectors are clustered by spherical k-means and
+    a query only scans the n_probe clusters whose centroids are closest to it. Below train_size
+    vectors the store searches exactly; the clustering is retrained whenever the store doubles.
+    """
+
+    kind = 'ivf'
+    row_arrays = ('vectors', 'live', 'assignments')
+
+    def __init__(self, dimension: int, n_lists: Optional[int] = None, n_probe: int = 4, train_size: int = 256, seed: int = 0):
+        super().__init__(dimension)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_size = train_size
+        self.seed = seed
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.centroids = None
+        self.trained_size = 0
+
+    def train(self, iterations: int = 10):
+        live = np.flatnonzero(self.live)
+        n_lists = min(len(live), self.n_lists or max(1, int(np.sqrt(len(live)))))
+        rng = np.random.default_rng(self.seed)
+        centroids = self.vectors[rng.choice(live, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(self.vectors[live] @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.vectors[live[assignments == c]]
+                if len(members):
+                    centroids[c] = _normalize(members.mean(axis=0))
+        self.centroids = centroids
+        self.trained_size = len(live)
+        self._assign(live)
+
+    def _assign(self, rows: np.ndarray):
+        self.assignments[rows] = np.argmax(self.vectors[rows] @ self.centroids.T, axis=1)
+
+    def _on_rows_changed(self, rows: np.ndarray):
+        if len(self) >= self.train_size and (self.centroids is None or len(self) >= 2 * self.trained_size):
+            self.train()
+        elif self.centroids is not None:
+            self._assign(rows)
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.flatnonzero(self.live)
+        probe = np.argsort(-(self.centroids @ query))[:self.n_probe]
+        return np.flatnonzero(self.live & np.isin(self.assignments, probe))
+
+    def _grow(self, n: int):
+        super()._grow(n)
+        self.assignments = np.concatenate([self.assignments, np.full(n, -1, dtype=np.int32)])
+
+    def _state(self) -> dict:
+        return {'n_lists': self.n_lists, 'n_probe': self.n_probe, 'train_size': self.train_size, 'seed': self.seed, 'trained_size': self.trained_size}
+
+    def _extra_arrays(self) -> dict:
+        return {} if self.centroids is None else {'centroids': self.centroids}
+
+    def _load_state(self, state: dict, arrays):
+        self.trained_size = state['trained_size']
+        self.centroids = arrays['centroids'] if 'centroids' in arrays else None
+
+
+VECTOR_STORES = {'exact': VectorStore, 'ivf': IVFVectorStore}
+
+
+def create_vector_store(kind: str, dimension: int, **kwargs) -> VectorStore:
+    if kind not in VECTOR_STORES:
+        raise ValueError(f"Unknown vector store '{kind}', expected one of {list(VECTOR_STORES)}")
+    return VECTOR_STORES[kind](dimension, **kwargs)
+
+
+def load_vector_store(path: str) -> VectorStore:
+    with np.load(path, allow_pickle=False) as arrays:
+        arrays = dict(arrays)
+    header = json.loads(str(arrays.pop('header')))
+    store = VECTOR_STORES[header['kind']](header['dimension'], **{k: v for k, v in header['state'].items() if k != 'trained_size'})
+    for name in store.row_arrays:
+        setattr(store, name, arrays[name])
+    store.ids = header['ids']
+    store.rows = {id_: row for row, id_ in enumerate(store.ids)}
+    store.metadata = header['metadata']
+    store._load_state(header['state'], arrays)
+    return store
@@ -0,0 +1,138 @@
+import os
+import shutil
+import stat
+from typing import Callable, Dict, List, Tuple
+
+
+def _make_read_only(path: str):
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+# Linux ioctl that makes dst share src's extents copy-on-write (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+
+def _clone(src: str, dst: str) -> bool:
+    """Reflink src to dst where the filesystem supports it; return False when a real copy is needed."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    except OSError:
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def link_file(src: str, dst: str):
+    """
+    Give dst its own copy of src: a copy-on-write clone where the filesystem supports it, a real copy otherwise.
+    dst never shares an inode with src, so a script writing into it cannot reach the source, and making it
+    read-only leaves the source permissions untouched.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if not _clone(src, dst):
+        shutil.copy2(src, dst)
+    _make_read_only(dst)
+
+
+def share_file(src: str, dst: str):
+    """
+    Hard-link an agent-owned, read-only file (e.g. from the shared code directory) into dst, copying only
+    when the link is impossible (e.g. across devices). Never use it on the source dataset: see link_file.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+        _make_read_only(dst)
+
+
+def _signature(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def link_tree(src_dir: str, dst_dir: str, exclude: Tuple[str, ...] = (), link: Callable[[str, str], None] = link_file) -> Dict[str, tuple]:
+    """
+    Mirror every file of src_dir into dst_dir with link (link_file by default, share_file for agent-owned copies).
+
+    Returns:
+        dict: Relative path -> (inode, size, mtime) of every linked file, used to tell inputs from outputs later.
+    """
+    linked = {}
+    for root, dirs, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        dirs[:] = [d for d in dirs if d not in exclude]
+        os.makedirs(os.path.join(dst_dir, rel_root), exist_ok=True)
+        for name in files:
+            if name in exclude:
+                continue
+            rel_path = os.path.normpath(os.path.join(rel_root, name))
+            dst = os.path.join(dst_dir, rel_path)
+            link(os.path.join(root, name), dst)
+            linked[rel_path] = _signature(dst)
+    return linked
+
+
+class TaskWorkspace:
+    """
+    Per-task overlay directories on top of the shared code directory.
+
+    Every candidate execution runs in a fresh directory under workspace/{name}/ in which the
+    shared files (the agent's read-only dataset copies and outputs promoted by earlier tasks) are
+    hard-linked, so a run costs no copying. Files the script creates stay in that directory until
+    promote() moves them into the shared area.
+    """
+
+    def __init__(self, shared_dir: str, name: str):
+        self.shared_dir = shared_dir
+        self.root = os.path.join(os.path.dirname(os.path.normpath(shared_dir)), 'workspace', name)
+        self.inputs = {}
+        self.run_count = 0
+
+    def new_run(self) -> str:
+        self.run_count += 1
+        run_dir = os.path.join(self.root, f'run{self.run_count}')
+        if os.path.exists(run_dir):
+            shutil.rmtree(run_dir)
+        self.inputs[run_dir] = link_tree(self.shared_dir, run_dir, link=share_file)
+        return run_dir
+
+    def outputs(self, run_dir: str) -> List[str]:
+        """Relative paths of the files created, replaced or modified by the execution in run_dir."""
+        inputs = self.inputs.get(run_dir, {})
+        outputs = []
+        for root, dirs, files in os.walk(run_dir):
+            dirs[:] = [d for d in dirs if d != '__pycache__']
+            for name in files:
+                path = os.path.join(root, name)
+                rel_path = os.path.normpath(os.path.relpath(path, run_dir))
+                if os.path.islink(path) or inputs.get(rel_path) == _signature(path):
+                    continue
+                outputs.append(rel_path)
+        return sorted(outputs)
+
+    def promote(self, run_dir: str, files: List[str]) -> List[str]:
+        """Move the given files from run_dir into the shared directory, read-only, and return their shared paths."""
+        promoted = []
+        for rel_path in files:
+            dst = os.path.join(self.shared_dir, rel_path)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.replace(os.path.join(run_dir, rel_path), dst)
+            _make_read_only(dst)
+            promoted.append(dst)
+        return promoted
+
+    def discard(self, run_dir: str):
+        self.inputs.pop(run_dir, None)
+        shutil.rmtree(run_dir, ignore_errors=True)
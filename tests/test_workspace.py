@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'MMAgent'))
+
+from utils.workspace import TaskWorkspace, link_tree
+
+
+def _dataset(tmp_path):
+    source = tmp_path / 'dataset'
+    source.mkdir()
+    (source / 'data.csv').write_text('a,b\n1,2\n')
+    shared = tmp_path / 'output' / 'code'
+    shared.mkdir(parents=True)
+    link_tree(str(source), str(shared))
+    return source, shared
+
+
+def test_shared_copy_does_not_share_the_source_inode(tmp_path):
+    source, shared = _dataset(tmp_path)
+    assert os.stat(shared / 'data.csv').st_ino != os.stat(source / 'data.csv').st_ino
+    assert os.stat(source / 'data.csv').st_mode & 0o200
+
+
+def test_run_inputs_are_hard_linked_from_the_shared_copy(tmp_path):
+    _, shared = _dataset(tmp_path)
+    workspace = TaskWorkspace(str(shared), 'main1')
+    run_dir = workspace.new_run()
+    assert os.stat(os.path.join(run_dir, 'data.csv')).st_ino == os.stat(shared / 'data.csv').st_ino
+    with open(os.path.join(run_dir, 'result.csv'), 'w') as f:
+        f.write('x\n')
+    assert workspace.outputs(run_dir) == ['result.csv']
+    workspace.promote(run_dir, workspace.outputs(run_dir))
+    workspace.discard(run_dir)
+    assert (shared / 'result.csv').read_text() == 'x\n'